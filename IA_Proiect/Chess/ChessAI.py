@@ -2,6 +2,14 @@
 This is the AI module for a chess game.
 '''
 
+from array import array
+import copy
+import json
+import multiprocessing
+import threading
+import time
+import ChessEngine, ChessBook, ChessBitbase
+
 piecesScore = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
 
 # Piece-Square Tables for positional evaluation
@@ -80,106 +88,933 @@ piecePositionScores = {
     'K': kingScores
 }
 
+# GameState keeps running material and positional totals computed from these tables
+ChessEngine.setEvaluationTables(piecesScore, piecePositionScores)
+# Scores are in evaluation points, not pawns: material counts a pawn as 1 but a square of the tables above is worth up
+# to 8. A pawn on the board averages about 2.5 points (1 of material and its square), so that is what a pawn of score
+# is taken to be wherever a score is shown (UCI "cp", the evaluation bar).
+CENTIPAWNS_PER_POINT = 40
+
 CHECKMATE = 1000
 STALEMATE = 0
 DEPTH = 3
+MAX_SEARCH_DEPTH = 64 # depth cap when searching on a time or node budget
+ASPIRATION_WINDOW = 2 # half-width of the window around the previous iteration's score
+DELTA_MARGIN = 8 # most a capture can gain in quiescence beyond the victim's value, the piece-square tables swing a lot
+# selective search, each part can be switched off to compare (ChessMatch nullmove=0 / lmr=0, ChessSearchBench --no-...)
+NULL_MOVE_PRUNING = True
+NULL_MOVE_MIN_DEPTH = 3 # near the leaves, where most nodes are, trying it costs more than the cutoffs save
+NULL_MOVE_REDUCTION = 2 # the null move is searched this much shallower than a real move would be
+LATE_MOVE_REDUCTIONS = True
+LMR_FULL_DEPTH_MOVES = 3 # moves searched to full depth before the quiet ones start to be reduced
+LMR_DEEP_REDUCTION_MOVES = 6 # moves after which a late quiet move is reduced by two plies instead of one
+LMR_MIN_DEPTH = 3
+# scores further than this from 0 are mates, they are stored in the transposition table relative to the node
+MATE_THRESHOLD = CHECKMATE - 100
+HASH_SIZE_MB = 16
+ANALYSIS_DEPTH = 6 # the analysis of a position that sits unchanged stops here, so an idle board doesn't keep a core busy
+# bitbase wins score below the mates (so a real mate found by the search still wins out) and above any material count
+KNOWN_WIN = 500
+
+# transposition table bound types
+EXACT = 0
+LOWER_BOUND = 1 # the search failed high, the real score is at least the stored one
+UPPER_BOUND = 2 # the search failed low, the real score is at most the stored one
+
+'''
+Fixed-size transposition table keyed by the Zobrist key of the position.
+Entries live in two flat arrays of 64-bit ints, so the memory used is bounded by the size given in MB.
+Each bucket has two slots: the first keeps the deepest result (depth-preferred),
+the second takes whatever did not go into the first (always-replace).
+An entry is one data word (score, depth, bound, best move, search generation) and one check word (key XOR data).
+'''
+class TranspositionTable():
+    ENTRY_BYTES = 16 # check word + data word
+    SCORE_OFFSET = 1 << 31 # scores are stored unsigned in the low 32 bits
+
+    def __init__(self, sizeMB = HASH_SIZE_MB):
+        entries = max(2, int(sizeMB * 1024 * 1024) // self.ENTRY_BYTES)
+        buckets = 1 << ((entries // 2).bit_length() - 1) # round down to a power of two so the index is a mask
+        self.mask = buckets - 1
+        self.checks = array('Q', bytes(8 * 2 * buckets))
+        self.data = array('Q', bytes(8 * 2 * buckets))
+        self.generation = 1 # empty slots have generation 0, so they always count as stale
+
+    '''
+    Start a new search: entries from older searches may now be overwritten regardless of their depth.
+    '''
+    def newSearch(self):
+        self.generation = self.generation % 255 + 1
+
+    '''
+    Empty the table.
+    '''
+    def clear(self):
+        self.checks = array('Q', bytes(8 * len(self.checks)))
+        self.data = array('Q', bytes(8 * len(self.data)))
+
+    '''
+    Look up a position. Returns (depth, score, bound, moveID) or None, moveID is -1 when no best move is known.
+    '''
+    def probe(self, key):
+        index = (key & self.mask) << 1
+        for slot in (index, index + 1):
+            data = self.data[slot]
+            if data and self.checks[slot] ^ data == key:
+                return ((data >> 32) & 0xFF, (data & 0xFFFFFFFF) - self.SCORE_OFFSET, (data >> 40) & 3, ((data >> 42) & 0x3FFF) - 1)
+        return None
+
+    '''
+    Store a search result. The depth-preferred slot is only taken over by a search at least as deep,
+    or when its entry is left over from an older search.
+    '''
+    def store(self, key, depth, score, bound, moveID):
+        index = (key & self.mask) << 1
+        data = (score + self.SCORE_OFFSET) | min(depth, 0xFF) << 32 | bound << 40 | (moveID + 1) << 42 | self.generation << 56
+        stored = self.data[index]
+        if depth >= (stored >> 32) & 0xFF or stored >> 56 != self.generation:
+            self.data[index] = data
+            self.checks[index] = key ^ data
+        else:
+            self.data[index + 1] = data
+            self.checks[index + 1] = key ^ data
+
+transpositionTable = TranspositionTable(HASH_SIZE_MB)
+
+'''
+Resize the transposition table, this also clears it.
+'''
+def setHashSize(sizeMB):
+    global transpositionTable
+    transpositionTable = TranspositionTable(sizeMB)
+
+'''
+History heuristic: for every side and from/to square pair, how often a quiet move caused a beta cutoff,
+weighted by depth * depth. The counts are halved between searches so old games fade out.
+'''
+class HistoryTable():
+    MAX_VALUE = 1 << 20 # counts are halved when one gets this large, so they stay below the killer band
+
+    def __init__(self):
+        self.values = array('l', bytes(2 * 64 * 64 * array('l').itemsize))
+
+    '''
+    Halve all the counts.
+    '''
+    def age(self):
+        values = self.values
+        for i in range(len(values)):
+            if values[i]:
+                values[i] >>= 1
+
+    def clear(self):
+        self.values = array('l', bytes(2 * 64 * 64 * array('l').itemsize))
+
+    '''
+    Reward a quiet move that caused a beta cutoff at the given remaining depth.
+    '''
+    def add(self, whiteToMove, move, depth):
+        index = historyIndex(whiteToMove, move)
+        self.values[index] += depth * depth
+        if self.values[index] >= self.MAX_VALUE:
+            self.age()
+
+historyTable = HistoryTable()
+
+'''
+Index of a move in the history table.
+'''
+def historyIndex(whiteToMove, move):
+    return (0 if whiteToMove else 4096) | (move.startRow * 8 + move.startCol) << 6 | move.endRow * 8 + move.endCol
+
+openingBook = None
+
+'''
+Use the Polyglot book at path before searching, or no book when path is None.
+'''
+def setOpeningBook(path):
+    global openingBook
+    if openingBook is not None:
+        openingBook.close()
+    openingBook = ChessBook.OpeningBook(path) if path else None
+
+'''
+A weighted random book move for the position (checked against validMoves), or None when there is no book or
+the position is not in it.
+'''
+def probeBook(gs, validMoves):
+    if openingBook is None:
+        return None
+    return openingBook.chooseMove(gs, validMoves)
+
+'''
+Mate scores count plies from the root. The table stores them counted from the node instead,
+so they stay right when the same position is reached at another distance from the root.
+'''
+def scoreToTT(score, ply):
+    if score > MATE_THRESHOLD:
+        return score + ply
+    if score < -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+def scoreFromTT(score, ply):
+    if score > MATE_THRESHOLD:
+        return score - ply
+    if score < -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+'''
+Raised inside the search when the time or node limit is hit or the search is stopped, to unwind back to findBestMove.
+'''
+class SearchAborted(Exception):
+    pass
+
+'''
+What a search did, to see whether a change to move ordering or pruning helped: nodes (all of them, and how many of those
+were quiescence nodes), beta cutoffs in the main search and how many of them came from the first move tried
+(good ordering pushes that towards 100%), transposition table probes and hits, and the time. Kept in total and for every
+completed iteration, together with its nodes per second, score and principal variation.
+'''
+class SearchStats():
+    COUNTERS = ("nodes", "quiescenceNodes", "cutoffs", "firstMoveCutoffs", "ttProbes", "ttHits",
+                "nullMoveCutoffs", "reductions", "researches", "time") # time last, it isn't added up
+
+    def __init__(self):
+        self.nodes = 0 # copied from the search context, which counts them for its limits
+        self.quiescenceNodes = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.nullMoveCutoffs = 0
+        self.reductions = 0 # moves searched with late move reductions
+        self.researches = 0 # of those, the ones that beat alpha anyway and were searched again to full depth
+        self.time = 0.0
+        self.iterations = [] # one dict per completed iteration
+        self.iterationStart = dict.fromkeys(self.COUNTERS, 0) # the totals when the current iteration started
+
+    '''
+    Take over the node count and time from the search context.
+    '''
+    def update(self, search):
+        self.nodes = search.nodes
+        self.time = search.elapsed()
+
+    '''
+    Record an iteration that just completed: what it added to the totals, its score and principal variation.
+    '''
+    def endIteration(self, search, pv):
+        self.update(search)
+        totals = {name: getattr(self, name) for name in self.COUNTERS}
+        iteration = {"depth": search.completedDepth}
+        iteration.update((name, totals[name] - self.iterationStart[name]) for name in self.COUNTERS)
+        iteration["nps"] = int(iteration["nodes"] / max(iteration["time"], 1e-6))
+        iteration["score"] = search.bestScore
+        iteration["pv"] = [move.getUCINotation() for move in pv]
+        self.iterations.append(iteration)
+        self.iterationStart = totals
+
+    '''
+    Add the statistics of a parallel search worker. Iterations of the same depth are added up,
+    the score and principal variation of a depth are those of the share that scored best.
+    '''
+    def merge(self, other):
+        for name in self.COUNTERS[:-1]:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.time = max(self.time, other.time) # the workers run side by side
+        byDepth = {iteration["depth"]: iteration for iteration in self.iterations}
+        for iteration in other.iterations:
+            mine = byDepth.get(iteration["depth"])
+            if mine is None:
+                byDepth[iteration["depth"]] = dict(iteration)
+                continue
+            best = iteration if iteration["score"] > mine["score"] else mine
+            for name in self.COUNTERS[:-1]:
+                mine[name] += iteration[name]
+            mine["time"] = max(mine["time"], iteration["time"])
+            mine["nps"] = int(mine["nodes"] / max(mine["time"], 1e-6))
+            mine["score"], mine["pv"] = best["score"], best["pv"]
+        self.iterations = [byDepth[depth] for depth in sorted(byDepth)]
+
+    '''
+    Everything as a plain dict: the totals, the cutoff and hit rates, and the last iteration's depth, score and line.
+    '''
+    def toDict(self):
+        last = self.iterations[-1] if self.iterations else {"depth": 0, "score": 0, "pv": []}
+        return {
+            "depth": last["depth"],
+            "score": last["score"],
+            "pv": last["pv"],
+            **{name: getattr(self, name) for name in self.COUNTERS},
+            "nps": int(self.nodes / max(self.time, 1e-6)),
+            "firstMoveCutoffRate": self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0,
+            "ttHitRate": self.ttHits / self.ttProbes if self.ttProbes else 0.0,
+            "iterations": self.iterations,
+        }
+
+    def toJSON(self, indent = None):
+        return json.dumps(self.toDict(), indent = indent)
+
+'''
+Limits and bookkeeping for one call to findBestMove.
+The search counts its nodes here and only looks at the clock every NODES_BETWEEN_CHECKS nodes.
+'''
+class SearchContext():
+    NODES_BETWEEN_CHECKS = 1024
+
+    def __init__(self, maxDepth = None, timeLimit = None, nodeLimit = None):
+        self.startTime = time.perf_counter()
+        self.timeLimit = timeLimit
+        self.budgetStart = self.startTime # the time limit counts from here
+        self.deadline = self.startTime + timeLimit if timeLimit is not None else None
+        self.nodeLimit = nodeLimit
+        # with no limit at all, search to the default depth
+        if maxDepth is None:
+            maxDepth = MAX_SEARCH_DEPTH if (timeLimit is not None or nodeLimit is not None) else DEPTH
+        self.maxDepth = maxDepth
+        self.nodes = 0
+        self.stopRequested = False # set from another thread to cancel the search
+        self.stopEvent = None # in a parallel search worker, the event the main process sets to cancel it
+        self.nextCheck = self.NODES_BETWEEN_CHECKS if nodeLimit is None else min(nodeLimit, self.NODES_BETWEEN_CHECKS)
+        # result of the last completed iteration
+        self.bestMove = None
+        self.bestScore = 0
+        self.completedDepth = 0
+        self.onIteration = None # called with this context after every completed iteration (UCI info lines)
+        self.stats = SearchStats()
+        # two killer moves (moveIDs) per ply: quiet moves that caused a beta cutoff at that ply
+        self.killers = [[-1, -1] for _ in range(maxDepth + 1)]
+
+    '''
+    Count a node, and every so often check the node and time limits and whether the search was stopped.
+    '''
+    def countNode(self):
+        self.nodes += 1
+        if self.nodes >= self.nextCheck:
+            if self.isStopped():
+                raise SearchAborted()
+            if self.nodeLimit is not None and self.nodes >= self.nodeLimit:
+                raise SearchAborted()
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchAborted()
+            self.nextCheck = self.nodes + self.NODES_BETWEEN_CHECKS
+            if self.nodeLimit is not None:
+                self.nextCheck = min(self.nextCheck, self.nodeLimit)
+
+    '''
+    Remember a quiet move that caused a beta cutoff at this ply, keeping the two most recent ones.
+    '''
+    def addKiller(self, ply, move):
+        killers = self.killers[ply]
+        if killers[0] != move.moveID:
+            killers[1] = killers[0]
+            killers[0] = move.moveID
+
+    '''
+    Ask the search to stop, it notices within NODES_BETWEEN_CHECKS nodes. Safe to call from another thread.
+    '''
+    def stop(self):
+        self.stopRequested = True
+
+    '''
+    Whether the search was stopped, from another thread or, in a worker, from the main process.
+    '''
+    def isStopped(self):
+        return self.stopRequested or (self.stopEvent is not None and self.stopEvent.is_set())
+
+    '''
+    Give a running search a time budget counted from now, and optionally a new depth limit: on a ponder hit
+    the search goes on with what it already found, and the clock only starts when the expected move is played.
+    '''
+    def setLimits(self, timeLimit, maxDepth = None):
+        self.budgetStart = time.perf_counter()
+        self.timeLimit = timeLimit
+        self.deadline = self.budgetStart + timeLimit if timeLimit is not None else None
+        if maxDepth is not None:
+            self.maxDepth = min(maxDepth, len(self.killers) - 1)
+
+    '''
+    Seconds since the search started.
+    '''
+    def elapsed(self):
+        return time.perf_counter() - self.startTime
+
+    '''
+    Whether another iteration is worth starting: each one takes several times longer than the previous,
+    so once half the time is used up the next one would almost surely be cut off anyway.
+    '''
+    def canStartIteration(self, depth):
+        if depth > self.maxDepth or self.isStopped():
+            return False
+        if self.timeLimit is not None and time.perf_counter() - self.budgetStart >= self.timeLimit * 0.5:
+            return False
+        return self.nodeLimit is None or self.nodes < self.nodeLimit
+
 '''
 This is a helper function to make the best move using the minimax algorithm.
+A move from the opening book, if one is set and knows the position, is played without searching.
+Otherwise iterative deepening until maxDepth, or until the time budget (seconds) or node budget runs out.
+The move returned is the best move of the last completed iteration.
+With more than one worker the root moves are searched in that many processes, see parallelSearch.
+With returnStats the result is (move, SearchStats), the stats are empty for a book move.
 '''
-def findBestMove(gs, validMoves):
-    bestMove = None
-    # iterative deepening
-    maxDepth = DEPTH
-    for depth in range(1, maxDepth + 1):
-        alpha = -CHECKMATE
-        beta = CHECKMATE
-        # order root moves for better pruning
-        orderedMoves = orderMoves(validMoves, gs)
-        bestScore = -CHECKMATE
-        rootTurn = 1 if gs.whiteToMove else -1
-        for move in orderedMoves:
-            gs.makeMove(move)
-            nextMoves = gs.getValidMoves()
-            # pass the current root search depth so mate distance can be computed
-            score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -rootTurn, depth)
-            gs.undoMove()
-            if score > bestScore:
-                bestScore = score
-                bestMove = move
-            if bestScore > alpha:
-                alpha = bestScore
-            if alpha >= beta:
+def findBestMove(gs, validMoves, maxDepth = None, timeLimit = None, nodeLimit = None, workers = 1, returnStats = False):
+    search = SearchContext(maxDepth, timeLimit, nodeLimit)
+    search.bestMove = probeBook(gs, validMoves)
+    if search.bestMove is None:
+        if workers > 1:
+            parallelSearch(gs, validMoves, search, workers)
+        else:
+            iterativeDeepening(gs, validMoves, search)
+    if returnStats:
+        return search.bestMove, search.stats
+    return search.bestMove
+
+'''
+Runs findBestMove on a worker thread so the caller (the pygame loop) stays responsive.
+The search works on its own copy of the GameState, so the game can go on changing the original.
+Poll isDone() each frame and take getBestMove() once it is; cancel() drops a search that is no longer wanted.
+onIteration is called on the worker thread after every completed iteration, see SearchContext.
+With useBook False the opening book is skipped and the position is always searched: an analysis wants the evaluation,
+which a book move doesn't give.
+'''
+class BackgroundSearch():
+    def __init__(self, gs, maxDepth = None, timeLimit = None, nodeLimit = None, onIteration = None, useBook = True):
+        self.gameState = copy.deepcopy(gs)
+        self.useBook = useBook
+        self.search = SearchContext(maxDepth, timeLimit, nodeLimit)
+        self.search.onIteration = onIteration
+        self.cancelled = False
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def run(self):
+        validMoves = self.gameState.getValidMoves()
+        self.search.bestMove = probeBook(self.gameState, validMoves) if self.useBook else None
+        if self.search.bestMove is None:
+            iterativeDeepening(self.gameState, validMoves, self.search)
+
+    def isDone(self):
+        return not self.thread.is_alive()
+
+    '''
+    Stop the search; the worker thread ends on its own shortly after and its result is never used.
+    '''
+    def cancel(self):
+        self.cancelled = True
+        self.search.stop()
+
+    '''
+    The move found, or None while the search is still running or after it was cancelled.
+    '''
+    def getBestMove(self):
+        if self.cancelled or not self.isDone():
+            return None
+        return self.search.bestMove
+
+    '''
+    The SearchStats of the finished search, None while it is still running or after it was cancelled.
+    '''
+    def getStats(self):
+        if self.cancelled or not self.isDone():
+            return None
+        return self.search.stats
+
+'''
+Pondering: a BackgroundSearch of the position after the opponent's expected reply, run while they think.
+If they play ponderMove (isHit) the search is simply kept, it answers for the new position and has a head start;
+any other move and it is cancelled.
+With an AnalysisService its iterations also evaluate the position the opponent is thinking on (see ponderRecorder),
+so the evaluation bar keeps deepening while we ponder. For that it searches book positions too; the book still has
+the last word on the move once the search is over.
+'''
+class PonderSearch(BackgroundSearch):
+    def __init__(self, gs, ponderMove, maxDepth = None, timeLimit = None, nodeLimit = None, analysis = None):
+        position = copy.deepcopy(gs)
+        position.makeMove(ponderMove)
+        self.ponderMove = ponderMove
+        super().__init__(position, maxDepth, timeLimit, nodeLimit, analysis.ponderRecorder(gs, position) if analysis else None,
+                         useBook = False)
+
+    def isHit(self, move):
+        return move == self.ponderMove
+
+    def getBestMove(self):
+        move = super().getBestMove()
+        if move is None:
+            return None
+        return probeBook(self.gameState, self.gameState.getValidMoves()) or move
+
+'''
+The opponent's most likely reply in gs, the move to ponder on: the second move of the principal variation of our
+search that chose the last move (stats), if that move was played; else the best move the transposition table knows
+for the position; else the first move in search order. None when there are no moves.
+'''
+def guessReply(gs, validMoves, stats = None):
+    if not validMoves:
+        return None
+    if stats is not None and stats.iterations and gs.moveLog:
+        pv = stats.iterations[-1]["pv"]
+        if len(pv) > 1 and pv[0] == gs.moveLog[-1].getUCINotation():
+            for move in validMoves:
+                if move.getUCINotation() == pv[1]:
+                    return move
+    entry = transpositionTable.probe(gs.zobristKey)
+    if entry is not None:
+        for move in validMoves:
+            if move.moveID == entry[3]:
+                return move
+    return orderMoves(validMoves, gs)[0]
+
+'''
+Evaluation of the positions shown on the board, for the evaluation bar. A position gets its static evaluation at once,
+then a search deepens it in the background, one iteration at a time up to ANALYSIS_DEPTH, for as long as it stays
+on the board. Results are cached by Zobrist key (scores from white's point of view), so going back to a position,
+by undo for example, shows its evaluation straight away and only searches on if it isn't deep enough yet.
+version changes every time a result is stored: the display only has to redraw when it moves.
+'''
+class AnalysisService():
+    def __init__(self, maxDepth = ANALYSIS_DEPTH, cacheSize = 4096):
+        self.maxDepth = maxDepth
+        self.cacheSize = cacheSize
+        self.cache = {} # zobristKey -> (depth, score for white), depth 0 is the static evaluation
+        self.version = 0
+        self.key = None # the position being analysed
+        self.analysis = None # its BackgroundSearch
+
+    '''
+    Make gs the position analysed, nothing happens if it already is. The previous analysis is cancelled.
+    With deepen False only the static evaluation is cached, for a position that someone else is searching
+    (the AI, reporting through recorder); an analysis of that same position still running is stopped too.
+    '''
+    def analyse(self, gs, deepen = True):
+        if gs.zobristKey == self.key and (self.analysis is not None) == deepen:
+            return
+        self.stop()
+        self.key = gs.zobristKey
+        if self.key not in self.cache:
+            self.store(self.key, 0, scoreBoard(gs))
+        if deepen and self.cache[self.key][0] < self.maxDepth and not (gs.checkMate or gs.staleMate):
+            self.analysis = BackgroundSearch(gs, self.maxDepth, onIteration = self.recorder(gs), useBook = False)
+
+    '''
+    Cancel the running analysis, if any. The result of an iteration that still completes is cached all the same,
+    it is right for its position.
+    '''
+    def stop(self):
+        if self.analysis is not None:
+            self.analysis.cancel()
+            self.analysis = None
+        self.key = None
+
+    '''
+    An onIteration callback that caches every completed iteration of a search of gs.
+    '''
+    def recorder(self, gs):
+        key = gs.zobristKey
+        turn = 1 if gs.whiteToMove else -1
+        return lambda search: self.store(key, search.completedDepth, turn * search.bestScore)
+
+    '''
+    An onIteration callback for a ponder search of position, the board after the expected reply in gs.
+    Every iteration is cached for position and, one ply deeper, for gs: as far as the search can tell the best line
+    from gs goes through that reply, so its score stands in for the one of gs, the position on the board.
+    '''
+    def ponderRecorder(self, gs, position):
+        record = self.recorder(position)
+        key = gs.zobristKey
+        turn = 1 if position.whiteToMove else -1
+        def recordBoth(search):
+            record(search)
+            score = search.bestScore
+            if abs(score) > MATE_THRESHOLD: # the mate is one ply further away from gs
+                score += -1 if score > 0 else 1
+            self.store(key, search.completedDepth + 1, turn * score)
+        return recordBoth
+
+    def store(self, key, depth, score):
+        if key in self.cache and self.cache[key][0] >= depth:
+            return
+        self.cache[key] = (depth, score)
+        while len(self.cache) > self.cacheSize: # drop the oldest positions
+            del self.cache[next(iter(self.cache))]
+        self.version += 1
+
+    '''
+    (depth, score for white) of the position, or None if it has not been seen.
+    '''
+    def getEval(self, gs):
+        return self.cache.get(gs.zobristKey)
+
+'''
+Run the iterative deepening loop for the given search context and return it with the result filled in.
+Every iteration after the first starts with an aspiration window around the previous score
+and tries the previous best move first. A score outside the window is searched again with that side opened up before
+its move is taken, and an iteration cut off by a limit leaves the result of the last completed one in place.
+'''
+def iterativeDeepening(gs, validMoves, search):
+    transpositionTable.newSearch()
+    historyTable.age()
+    if len(validMoves) == 0:
+        return search
+    search.bestMove = orderMoves(validMoves, gs)[0] # something to play even if the first iteration is cut off
+    rootPly = len(gs.moveLog)
+    depth = 1
+    try:
+        while search.canStartIteration(depth):
+            # aspiration window: expect the score close to the previous one, open the window on the failing side
+            if depth > 1 and abs(search.bestScore) < MATE_THRESHOLD:
+                alpha = search.bestScore - ASPIRATION_WINDOW
+                beta = search.bestScore + ASPIRATION_WINDOW
+            else:
+                alpha = -CHECKMATE
+                beta = CHECKMATE
+            while True:
+                score, move = searchRoot(gs, validMoves, depth, alpha, beta, search)
+                if score <= alpha and alpha > -CHECKMATE: # failed low
+                    alpha = -CHECKMATE
+                elif score >= beta and beta < CHECKMATE: # failed high
+                    beta = CHECKMATE
+                else:
+                    break
+            search.bestMove = move
+            search.bestScore = score
+            search.completedDepth = depth
+            pv = getPrincipalVariation(gs, depth)
+            if not pv or pv[0] != move: # the table entry was overwritten, the best move is still known
+                pv = [move]
+            search.stats.endIteration(search, pv)
+            if search.onIteration is not None:
+                search.onIteration(search)
+            if abs(score) > MATE_THRESHOLD: # a forced mate was found, searching deeper won't find a shorter one
                 break
-    return bestMove
+            depth += 1
+    except SearchAborted:
+        # take back the moves of the unfinished iteration
+        while len(gs.moveLog) > rootPly:
+            gs.undoMove()
+    search.stats.update(search)
+    return search
+
+'''
+Worker task for the parallel search: iterative deepening over one share of the root moves.
+The GameState arrives pickled, so every worker searches its own copy with its own transposition table.
+'''
+def searchRootShare(task):
+    global NULL_MOVE_PRUNING, LATE_MOVE_REDUCTIONS
+    gs, moveIDs, maxDepth, timeLimit, nodeLimit, (NULL_MOVE_PRUNING, LATE_MOVE_REDUCTIONS) = task
+    rootMoves = [move for move in gs.getValidMoves() if move.moveID in moveIDs]
+    search = SearchContext(maxDepth, timeLimit, nodeLimit)
+    search.stopEvent = workerStopEvent
+    completed = [] # (score, moveID) of every completed iteration, index = depth - 1
+    search.onIteration = lambda search: completed.append((search.bestScore, search.bestMove.moveID))
+    search = iterativeDeepening(gs, rootMoves, search)
+    return completed, search.nodes, search.stats
+
+workerPool = None
+workerPoolSize = 0
+workerStopEvent = None # shared with the pool's processes, set to make every worker give up its search
+STOP_POLL_INTERVAL = 0.02 # seconds between two looks at stopRequested while the workers search
+
+'''
+Pool initializer: keep the stop event in the worker process, its searches check it with their other limits.
+'''
+def initWorker(stopEvent):
+    global workerStopEvent
+    workerStopEvent = stopEvent
+
+'''
+Process pool for the parallel search, created on first use and kept for the next moves.
+'''
+def getWorkerPool(workers):
+    global workerPool, workerPoolSize, workerStopEvent
+    if workerPool is None or workerPoolSize != workers:
+        if workerPool is not None:
+            workerPool.terminate()
+        workerStopEvent = multiprocessing.Event()
+        workerPool = multiprocessing.Pool(workers, initializer = initWorker, initargs = (workerStopEvent,))
+        workerPoolSize = workers
+    return workerPool
+
+'''
+Root-split search over several processes (threads would all wait on the GIL).
+The root moves are ordered once and dealt out round robin, so every worker gets some of the likely best moves,
+then each worker runs the normal iterative deepening on its share. The workers are compared at the deepest depth
+they all completed, a score from a shallower search never beats one from a deeper search. The best score wins,
+ties go to the move that was ordered first, so the result doesn't depend on which worker finishes first.
+The node limit is shared out between the workers; the time limit applies to each of them.
+search.stop() from another thread is passed on to the workers, which then answer with what they have found so far.
+'''
+def parallelSearch(gs, validMoves, search, workers):
+    if len(validMoves) == 0:
+        return search
+    pool = getWorkerPool(workers) # the full pool even when there are fewer moves, it isn't started again
+    entry = transpositionTable.probe(gs.zobristKey)
+    orderedMoves = orderMoves(validMoves, gs, entry[3] if entry else -1)
+    workers = min(workers, len(orderedMoves))
+    nodeLimit = search.nodeLimit // workers if search.nodeLimit is not None else None
+    switches = (NULL_MOVE_PRUNING, LATE_MOVE_REDUCTIONS) # the pool may have been started before they were changed
+    tasks = [(gs, {move.moveID for move in orderedMoves[i::workers]}, search.maxDepth, search.timeLimit, nodeLimit, switches)
+             for i in range(workers)]
+    workerStopEvent.clear()
+    pending = pool.map_async(searchRootShare, tasks, chunksize = 1)
+    while not pending.ready():
+        if search.stopRequested:
+            workerStopEvent.set()
+        pending.wait(STOP_POLL_INTERVAL)
+    results = pending.get()
+    # a worker stopped before its first iteration has nothing to compare
+    searched = [result[0] for result in results if result[0]]
+    moveRank = {move.moveID: i for i, move in enumerate(orderedMoves)}
+    if searched:
+        depth = min(len(completed) for completed in searched)
+        bestScore, bestMoveID = max((completed[depth - 1] for completed in searched),
+                                    key = lambda result: (result[0], -moveRank[result[1]]))
+        search.bestMove = orderedMoves[moveRank[bestMoveID]]
+        search.bestScore = bestScore
+        search.completedDepth = depth
+    else:
+        search.bestMove = orderedMoves[0]
+    search.nodes = sum(result[1] for result in results)
+    for result in results:
+        search.stats.merge(result[2])
+    return search
+
+'''
+Search all the root moves to the given depth inside the (alpha, beta) window. Returns (best score, best move).
+The previous iteration's best move is tried first.
+'''
+def searchRoot(gs, validMoves, depth, alpha, beta, search):
+    alphaOriginal = alpha
+    orderedMoves = orderMoves(validMoves, gs, search.bestMove.moveID if search.bestMove else -1)
+    bestScore = -CHECKMATE
+    bestMove = orderedMoves[0]
+    rootTurn = 1 if gs.whiteToMove else -1
+    for move in orderedMoves:
+        gs.makeMove(move)
+        nextMoves = gs.getValidMoves()
+        # pass the current root search depth so mate distance can be computed
+        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -rootTurn, depth, search)
+        gs.undoMove()
+        if score > bestScore:
+            bestScore = score
+            bestMove = move
+        if bestScore > alpha:
+            alpha = bestScore
+        if alpha >= beta:
+            break
+    if alphaOriginal < bestScore < beta:
+        transpositionTable.store(gs.zobristKey, depth, scoreToTT(bestScore, 0), EXACT, bestMove.moveID)
+    return bestScore, bestMove
+
+'''
+Principal variation: the line of best moves stored in the transposition table, starting from the current position.
+'''
+def getPrincipalVariation(gs, maxLength):
+    line = []
+    seenKeys = set()
+    while len(line) < maxLength and gs.zobristKey not in seenKeys:
+        seenKeys.add(gs.zobristKey)
+        entry = transpositionTable.probe(gs.zobristKey)
+        if entry is None or entry[3] < 0:
+            break
+        move = next((m for m in gs.getValidMoves() if m.moveID == entry[3]), None)
+        if move is None:
+            break
+        line.append(move)
+        gs.makeMove(move)
+    for _ in line:
+        gs.undoMove()
+    return line
 
 '''
 This function uses the NegaMax algorithm with alpha-beta pruning to find the best move.
+Scores are from the point of view of the side to move.
+Two ways of not searching everything to full depth, both off in check:
+- null move pruning: when the side to move is already above beta, let it pass; if a shallower search still can't bring
+  the opponent back under beta, a real move would do at least as well. Not tried without pieces other than pawns,
+  where passing could be the only good move (zugzwang), nor twice in a row, nor below NULL_MOVE_MIN_DEPTH.
+- late move reductions: quiet moves late in the ordering rarely turn out best, so they are searched one ply shallower
+  (two from the seventh on) with a null window; one that beats alpha all the same is searched again at full depth.
+The child's rootDepth is set so that rootDepth - depth stays the distance from the root after a reduction.
+'''
+def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier, rootDepth, search):
+    search.countNode()
+    ply = rootDepth - depth
+    # prefer faster mates: if this position is terminal, return mate score adjusted by distance
+    if gs.checkMate:
+        # the side to move is checkmated
+        return -(CHECKMATE - ply)
+    if gs.staleMate:
+        return STALEMATE
+    if depth == 0:
+        # use quiescence search at leaf; pass rootDepth for mate-distance accounting
+        return quiescence(alpha, beta, gs, turnMultiplier, rootDepth, search)
+    # a won bitbase ending is still searched so the mate can be found, a drawn one needs no search at all
+    if ChessBitbase.probe(gs) == 0:
+        return STALEMATE
+
+    # transposition table: reuse a result from a search at least as deep, or at least its best move
+    alphaOriginal = alpha
+    stats = search.stats
+    stats.ttProbes += 1
+    entry = transpositionTable.probe(gs.zobristKey)
+    ttMoveID = -1
+    if entry is not None:
+        stats.ttHits += 1
+        ttDepth, ttScore, ttBound, ttMoveID = entry
+        if ttDepth >= depth:
+            ttScore = scoreFromTT(ttScore, ply)
+            if ttBound == EXACT:
+                return ttScore
+            if ttBound == LOWER_BOUND and ttScore > alpha:
+                alpha = ttScore
+            elif ttBound == UPPER_BOUND and ttScore < beta:
+                beta = ttScore
+            if alpha >= beta:
+                return ttScore
+
+    inCheck = gs.inCheck()
+    if NULL_MOVE_PRUNING and depth >= NULL_MOVE_MIN_DEPTH and not inCheck and gs.moveLog[-1] is not None and beta < MATE_THRESHOLD:
+        color = 'w' if gs.whiteToMove else 'b'
+        pieces = gs.colorBitboards[color] ^ gs.bitboards[color + 'P'] ^ gs.bitboards[color + 'K']
+        if pieces and turnMultiplier * scoreBoard(gs) >= beta:
+            nullDepth = max(0, depth - 1 - NULL_MOVE_REDUCTION)
+            gs.makeNullMove()
+            nextMoves = gs.getValidMoves()
+            score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, nullDepth, -beta, -beta + 1, -turnMultiplier, ply + 1 + nullDepth, search)
+            gs.undoMove()
+            if score >= beta:
+                stats.nullMoveCutoffs += 1
+                return beta if score > MATE_THRESHOLD else score # a mate after passing proves nothing
+
+    # order moves to improve pruning
+    killers = search.killers[ply]
+    orderedMoves = orderMoves(validMoves, gs, ttMoveID, killers)
+    reduce = LATE_MOVE_REDUCTIONS and depth >= LMR_MIN_DEPTH and not inCheck
+    maxScore = -CHECKMATE
+    bestMove = None
+    for i, move in enumerate(orderedMoves):
+        gs.makeMove(move)
+        nextMoves = gs.getValidMoves()
+        if (reduce and i >= LMR_FULL_DEPTH_MOVES and move.pieceCaptured == "--" and not move.isPawnPromotion
+                and move.moveID not in killers and not gs.inCheck()):
+            stats.reductions += 1
+            lateDepth = depth - 2 if i < LMR_DEEP_REDUCTION_MOVES else max(1, depth - 3)
+            score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, lateDepth, -alpha - 1, -alpha, -turnMultiplier, ply + 1 + lateDepth, search)
+            if score > alpha:
+                stats.researches += 1
+                score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier, rootDepth, search)
+        else:
+            score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier, rootDepth, search)
+        if score > maxScore:
+            maxScore = score
+            bestMove = move
+        gs.undoMove()
+        if maxScore > alpha:  # pruning
+            alpha = maxScore
+        if alpha >= beta:
+            stats.cutoffs += 1
+            if i == 0:
+                stats.firstMoveCutoffs += 1
+            # a quiet move that refutes the previous move will likely refute its siblings too
+            if move.pieceCaptured == "--" and not move.isPawnPromotion:
+                search.addKiller(ply, move)
+                historyTable.add(gs.whiteToMove, move, depth)
+            break
+
+    if maxScore <= alphaOriginal:
+        bound = UPPER_BOUND
+    elif maxScore >= beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    transpositionTable.store(gs.zobristKey, depth, scoreToTT(maxScore, ply), bound, bestMove.moveID if bestMove else -1)
+    return maxScore
+
+# Move ordering bands, highest first. Every band is above the largest value the band below it can reach.
+ORDER_TT_MOVE = 1 << 30
+ORDER_CAPTURE = 1 << 26 # plus MVV-LVA and the promotion bonus
+ORDER_KILLER = 1 << 22 # first killer gets one more than the second
+ORDER_PROMOTION = 900
+# small tie-breaker: prefer moves towards the center (0 on the corners up to 6 in the center)
+CENTER_BONUS = [int(3 - (abs(3.5 - row) + abs(3.5 - col))) + 4 for row in range(8) for col in range(8)]
+
+'''
+MVV-LVA capture priorities for the given piece values, keyed by attacker + victim (e.g. "PQ").
 '''
-def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier, rootDepth):
-     # prefer faster mates: if this position is terminal, return mate score adjusted by distance
-     if gs.checkMate:
-         # if side to move is checkmated, it's a loss for the side to move
-         mate_distance = rootDepth - depth
-         if gs.whiteToMove:
-             return - (CHECKMATE - mate_distance)
-         else:
-             return CHECKMATE - mate_distance
-     if gs.staleMate:
-         return STALEMATE
-     if depth == 0:
-         # use quiescence search at leaf; pass rootDepth for mate-distance accounting
-         return turnMultiplier * quiescence(alpha, beta, gs, turnMultiplier, rootDepth)
- 
-     # order moves to improve pruning
-     orderedMoves = orderMoves(validMoves, gs)
-     maxScore = -CHECKMATE
-     for move in orderedMoves:
-         gs.makeMove(move)
-         nextMoves = gs.getValidMoves()
-         score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier, rootDepth)
-         if score > maxScore:
-             maxScore = score
-         gs.undoMove()
-         if maxScore > alpha:  # pruning
-             alpha = maxScore
-         if alpha >= beta:
-             break
-     return maxScore
-
-'''
-Ordering (MVV-LVA + promotion bonus).
-'''
-def orderMoves(moves, gs):
-	# prefer captures (victim value - attacker value) and promotions
-	def score(move):
-		score_val = 0
-		# capture: higher victim value -> higher priority, lower attacker value -> higher priority
-		if move.pieceCaptured != "--":
-			victim = piecesScore.get(move.pieceCaptured[1], 0)
-			attacker = piecesScore.get(move.pieceMoved[1], 0)
-			score_val += 1000 + (victim * 10 - attacker)  # MVV-LVA style
-		# pawn promotions
-		if move.isPawnPromotion:
-			score_val += 900
-		# small tie-breaker: prefer center moves (optional)
-		center_bonus = 3 - (abs(3.5 - move.endRow) + abs(3.5 - move.endCol)) 
-		score_val += int(center_bonus)
-		return -score_val  # negative because we'll sort ascending
-	return sorted(moves, key=score)
+def buildMVVLVA(pieceValues):
+    priorities = {}
+    for attacker in pieceValues:
+        for victim in pieceValues:
+            # capture: higher victim value -> higher priority, lower attacker value -> higher priority
+            priorities[attacker + victim] = pieceValues[victim] * 10 - pieceValues[attacker]
+    return priorities
+
+MVV_LVA = buildMVVLVA(piecesScore)
+
+'''
+Ordering: the move with ttMoveID (best move from the transposition table) goes first,
+then captures by MVV-LVA and promotions, then the killer moves of this ply, then quiet moves by history,
+and last the captures that lose material by static exchange evaluation, the worst one at the end.
+Every move gets an integer key with its index in the low 8 bits, so one plain sort of ints orders the list.
+'''
+def orderMoves(moves, gs, ttMoveID = -1, killers = (-1, -1)):
+    history = historyTable.values
+    side = 0 if gs.whiteToMove else 4096
+    killer1, killer2 = killers
+    keys = []
+    for i, move in enumerate(moves):
+        moveID = move.moveID
+        endSq = move.endRow * 8 + move.endCol
+        if moveID == ttMoveID:
+            key = ORDER_TT_MOVE
+        elif move.pieceCaptured != "--":
+            seeScore = gs.see(move) if piecesScore[move.pieceMoved[1]] > piecesScore[move.pieceCaptured[1]] else 0
+            if seeScore < 0: # losing capture, after the quiet moves
+                key = seeScore
+            else:
+                key = ORDER_CAPTURE + MVV_LVA[move.pieceMoved[1] + move.pieceCaptured[1]]
+                if move.isPawnPromotion:
+                    key += ORDER_PROMOTION
+        elif move.isPawnPromotion:
+            key = ORDER_CAPTURE + ORDER_PROMOTION
+        elif moveID == killer1:
+            key = ORDER_KILLER + 1
+        elif moveID == killer2:
+            key = ORDER_KILLER
+        else:
+            key = history[side | (move.startRow * 8 + move.startCol) << 6 | endSq]
+        keys.append((key << 3 | CENTER_BONUS[endSq]) << 8 | i)
+    keys.sort(reverse = True)
+    return [moves[key & 255] for key in keys]
+
+'''
+A capture loses material if taking with a more valuable piece than the victim runs into a bad exchange.
+Taking a piece worth at least as much as the capturing one can never lose, so SEE is only run for the rest.
+'''
+def isLosingCapture(gs, move):
+    if move.pieceCaptured == "--" or move.isPawnPromotion:
+        return False
+    return piecesScore[move.pieceMoved[1]] > piecesScore[move.pieceCaptured[1]] and gs.see(move) < 0
 
 '''
 Quiescence search (captures only).
 '''
-def quiescence(alpha, beta, gs, turnMultiplier, rootDepth):
+def quiescence(alpha, beta, gs, turnMultiplier, rootDepth, search):
+    search.countNode()
+    search.stats.quiescenceNodes += 1
     # terminal check first so mates discovered in quiescence are distance-weighted
     if gs.checkMate:
         mate_distance = rootDepth  # quiescence is called at depth == 0 so use rootDepth
-        if gs.whiteToMove:
-            return - (CHECKMATE - mate_distance)
-        else:
-            return CHECKMATE - mate_distance
+        return -(CHECKMATE - mate_distance) # the side to move is checkmated
     if gs.staleMate:
         return STALEMATE
+    knownScore = bitbaseScore(gs)
+    if knownScore is not None:
+        return knownScore
 
     stand_pat = turnMultiplier * scoreBoard(gs)
     if stand_pat >= beta:
@@ -187,12 +1022,15 @@ def quiescence(alpha, beta, gs, turnMultiplier, rootDepth):
     if alpha < stand_pat:
         alpha = stand_pat
 
-    # generate captures only
-    capture_moves = [m for m in gs.getAllPossibleMoves() if m.pieceCaptured != "--" or m.isEnpassantMove]
-    capture_moves = orderMoves(capture_moves, gs)
+    # generate captures only, already in MVV-LVA order
+    # delta pruning: a capture that can't lift the score to alpha even with the margin on top is not generated
+    capture_moves = gs.getCaptureMoves(alpha - stand_pat - DELTA_MARGIN)
     for move in capture_moves:
+        # captures that lose material once the exchange is played out are not worth searching
+        if isLosingCapture(gs, move):
+            continue
         gs.makeMove(move)
-        score = -quiescence(-beta, -alpha, gs, -turnMultiplier, rootDepth)
+        score = -quiescence(-beta, -alpha, gs, -turnMultiplier, rootDepth, search)
         gs.undoMove()
         if score >= beta:
             return score
@@ -200,6 +1038,30 @@ def quiescence(alpha, beta, gs, turnMultiplier, rootDepth):
             alpha = score
     return alpha
 
+'''
+Exact result of a KQK, KRK or KPK position from the endgame bitbases, from the side to move's point of view,
+or None when it isn't one of those endings (or the tables haven't been generated).
+A win is KNOWN_WIN plus a bonus that leads the search towards the mate: with a queen or rook the lone king is driven
+to the edge and the kings brought together, with a pawn the pawn is pushed (a win with a pawn stays below one with a queen,
+so the promotion is always taken).
+'''
+def bitbaseScore(gs):
+    result = ChessBitbase.probe(gs)
+    if not result:
+        return result
+    bitboards = gs.bitboards
+    strongColor = 'w' if (result > 0) == gs.whiteToMove else 'b'
+    weakColor = 'b' if strongColor == 'w' else 'w'
+    strongKing = bitboards[strongColor + 'K'].bit_length() - 1
+    weakKing = bitboards[weakColor + 'K'].bit_length() - 1
+    pawn = bitboards[strongColor + 'P']
+    if pawn:
+        row = (pawn.bit_length() - 1) // 8
+        advance = 6 - row if strongColor == 'w' else row - 1
+        return result * (KNOWN_WIN - 50 + 6 * advance)
+    kingDistance = max(abs(strongKing // 8 - weakKing // 8), abs(strongKing % 8 - weakKing % 8))
+    return result * (KNOWN_WIN + 2 * (6 - CENTER_BONUS[weakKing]) + 7 - kingDistance)
+
 '''
 Simple material-only scorer used by the UI (returns pawn-units, white positive).
 '''
@@ -229,22 +1091,6 @@ def scoreBoard(gs):
             return CHECKMATE  # white wins
     elif gs.staleMate:
         return STALEMATE
-    score = 0
-    for row in range(len(gs.board)):
-        for coll in range(len(gs.board[row])):
-            square= gs.board[row][coll]
-            if square != "--":
-                #score it positionally
-                if square[1] in piecePositionScores:
-                    piecePositionScore = piecePositionScores[square[1]]
-                    if square[0] == 'w':
-                        score += piecePositionScore[row][coll]
-                    elif square[0] == 'b':
-                        score -= piecePositionScore[7 - row][7 - coll]
-                #score it by piece value
-                if square[0] == 'w':
-                    score += piecesScore[square[1]]
-                elif square[0] == 'b':
-                    score -= piecesScore[square[1]]
-    return score
+    # material and positional totals are kept up to date by makeMove/undoMove, so this is O(1)
+    return (gs.materialScore['w'] - gs.materialScore['b']) + (gs.positionScore['w'] - gs.positionScore['b'])
 
@@ -0,0 +1,237 @@
+'''
+Endgame bitbases for king and pawn, king and rook and king and queen against a lone king (KPK, KRK, KQK).
+For every position one bit says whether the side with the extra piece wins; everything else is a draw.
+The tables are solved backwards from the mates (retrograde analysis) and written bit-packed, 64 KB each,
+then probed through mmap during the search.
+Generate them once from this folder (KQK first, KPK needs it for the promotions):
+    python ChessBitbase.py
+The files go to the bitbases folder next to this file; while they are missing the search simply doesn't probe.
+'''
+
+import argparse
+import mmap
+import os
+import time
+from array import array
+from collections import deque
+from ChessEngine import KING_ATTACKS, PAWN_ATTACKS, rookAttacks, bishopAttacks
+
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+BITBASE_PIECES = ("Q", "R", "P") # generation order, KPK looks up KQK
+POSITIONS = 1 << 19 # side to move, strong king, weak king, piece square
+STRONG_TO_MOVE, WEAK_TO_MOVE = 0, 1
+NO_LOSS = 255 # move counter of a weak side position that can take the piece, it can never be lost
+
+'''
+Index of a position with the strong side playing white (up the board, towards row 0).
+'''
+def bitbaseIndex(sideToMove, strongKing, weakKing, pieceSq):
+    return sideToMove << 18 | strongKing << 12 | weakKing << 6 | pieceSq
+
+'''
+Squares the strong piece attacks from sq with the given occupancy.
+'''
+def pieceAttacks(piece, sq, occupied):
+    if piece == 'Q':
+        return rookAttacks(sq, occupied) | bishopAttacks(sq, occupied)
+    if piece == 'R':
+        return rookAttacks(sq, occupied)
+    return PAWN_ATTACKS['w'][sq]
+
+'''
+Whether the position can occur: three different squares, kings apart, pawns not on the first or last rank
+and, with the strong side to move, the weak king not in check.
+'''
+def isLegal(piece, sideToMove, strongKing, weakKing, pieceSq):
+    if strongKing == weakKing or strongKing == pieceSq or weakKing == pieceSq:
+        return False
+    if KING_ATTACKS[strongKing] >> weakKing & 1:
+        return False
+    if piece == 'P' and not 8 <= pieceSq < 56:
+        return False
+    if sideToMove == STRONG_TO_MOVE:
+        occupied = 1 << strongKing | 1 << weakKing | 1 << pieceSq
+        return not pieceAttacks(piece, pieceSq, occupied) >> weakKing & 1
+    return True
+
+'''
+Solve one endgame. Returns the bit-packed table (a bit set where the strong side wins).
+Weak side positions count their legal moves; every time one of them turns out to reach a strong side win the count
+goes down, and at zero the position is lost. Strong side positions are won as soon as one move reaches a lost one.
+Both are found by walking the moves backwards (un-moves) from the positions just solved, so every position is
+looked at only a few times instead of re-scanning the whole table until nothing changes.
+'''
+def generate(piece, queenTable = None):
+    solved = bytearray(POSITIONS) # 1 = strong side wins
+    moveCounts = array('B', bytes(POSITIONS >> 1)) # for the weak side to move positions
+    queue = deque()
+    for strongKing in range(64):
+        for weakKing in range(64):
+            for pieceSq in range(64):
+                if not isLegal(piece, WEAK_TO_MOVE, strongKing, weakKing, pieceSq):
+                    continue
+                index = bitbaseIndex(WEAK_TO_MOVE, strongKing, weakKing, pieceSq)
+                occupied = 1 << strongKing | 1 << pieceSq # the weak king is lifted, it can't hide behind itself
+                guarded = KING_ATTACKS[strongKing] | pieceAttacks(piece, pieceSq, occupied)
+                count = 0
+                targets = KING_ATTACKS[weakKing]
+                if targets >> pieceSq & 1 and not KING_ATTACKS[strongKing] >> pieceSq & 1:
+                    count = NO_LOSS # the piece can be taken: a bare king draw
+                else:
+                    targets &= ~guarded & ~(1 << pieceSq)
+                    while targets:
+                        targets &= targets - 1
+                        count += 1
+                moveCounts[index & (POSITIONS >> 1) - 1] = count
+                if count == 0 and guarded >> weakKing & 1: # checkmate
+                    solved[index] = 1
+                    queue.append(index)
+    if piece == 'P':
+        # promotions: won if the new queen wins with the weak side to move
+        for strongKing in range(64):
+            for weakKing in range(64):
+                for pieceSq in range(8, 16):
+                    promotionSq = pieceSq - 8
+                    if promotionSq in (strongKing, weakKing) or not isLegal(piece, STRONG_TO_MOVE, strongKing, weakKing, pieceSq):
+                        continue
+                    if queenTable.isWin(bitbaseIndex(WEAK_TO_MOVE, strongKing, weakKing, promotionSq)):
+                        index = bitbaseIndex(STRONG_TO_MOVE, strongKing, weakKing, pieceSq)
+                        solved[index] = 1
+                        queue.append(index)
+
+    while queue:
+        index = queue.popleft()
+        sideToMove, strongKing, weakKing, pieceSq = index >> 18, index >> 12 & 63, index >> 6 & 63, index & 63
+        if sideToMove == WEAK_TO_MOVE:
+            # lost for the weak side: every strong side position with a move into it is won
+            for previous in strongUnmoves(piece, strongKing, weakKing, pieceSq):
+                if not solved[previous]:
+                    solved[previous] = 1
+                    queue.append(previous)
+        else:
+            # won for the strong side: the weak side positions with a king move into it lose one way out
+            targets = KING_ATTACKS[weakKing] & ~KING_ATTACKS[strongKing] & ~(1 << pieceSq)
+            while targets:
+                fromSq = (targets & -targets).bit_length() - 1
+                targets &= targets - 1
+                previous = bitbaseIndex(WEAK_TO_MOVE, strongKing, fromSq, pieceSq)
+                slot = previous & (POSITIONS >> 1) - 1
+                if solved[previous] or moveCounts[slot] == NO_LOSS:
+                    continue
+                moveCounts[slot] -= 1
+                if moveCounts[slot] == 0:
+                    solved[previous] = 1
+                    queue.append(previous)
+
+    bits = bytearray(POSITIONS >> 3)
+    for index in range(POSITIONS):
+        if solved[index]:
+            bits[index >> 3] |= 1 << (index & 7)
+    return bits
+
+'''
+Strong side to move positions that reach the given weak side to move position in one move (king or piece taken back).
+'''
+def strongUnmoves(piece, strongKing, weakKing, pieceSq):
+    previous = []
+    fromSquares = KING_ATTACKS[strongKing] & ~(1 << pieceSq) & ~KING_ATTACKS[weakKing] & ~(1 << weakKing)
+    while fromSquares:
+        fromSq = (fromSquares & -fromSquares).bit_length() - 1
+        fromSquares &= fromSquares - 1
+        if isLegal(piece, STRONG_TO_MOVE, fromSq, weakKing, pieceSq):
+            previous.append(bitbaseIndex(STRONG_TO_MOVE, fromSq, weakKing, pieceSq))
+    occupied = 1 << strongKing | 1 << weakKing
+    if piece == 'P':
+        fromSquares = 0
+        if pieceSq + 8 < 56 and not occupied >> (pieceSq + 8) & 1:
+            fromSquares |= 1 << (pieceSq + 8)
+            if 32 <= pieceSq < 40 and not occupied >> (pieceSq + 16) & 1: # double step from the second rank
+                fromSquares |= 1 << (pieceSq + 16)
+    else:
+        fromSquares = pieceAttacks(piece, pieceSq, occupied) & ~occupied # sliders move the same way back
+    while fromSquares:
+        fromSq = (fromSquares & -fromSquares).bit_length() - 1
+        fromSquares &= fromSquares - 1
+        if isLegal(piece, STRONG_TO_MOVE, strongKing, weakKing, fromSq):
+            previous.append(bitbaseIndex(STRONG_TO_MOVE, strongKing, weakKing, fromSq))
+    return previous
+
+'''
+A generated table, memory-mapped read-only.
+'''
+class Bitbase():
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+
+    def isWin(self, index):
+        return self.data[index >> 3] >> (index & 7) & 1
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+'''
+Table file of an endgame, e.g. bitbases/kqk.bin.
+'''
+def bitbasePath(piece):
+    return os.path.join(BITBASE_DIR, "k" + piece.lower() + "k.bin")
+
+loadedBitbases = {}
+
+'''
+The table for the piece, opened on first use. None if it hasn't been generated.
+'''
+def getBitbase(piece):
+    if piece not in loadedBitbases:
+        path = bitbasePath(piece)
+        loadedBitbases[piece] = Bitbase(path) if os.path.exists(path) else None
+    return loadedBitbases[piece]
+
+'''
+Result of the position for the side to move (1 win, 0 draw, -1 loss) if it is a bitbase ending and the table exists,
+else None. A position with black as the strong side is looked up mirrored top to bottom.
+'''
+def probe(gs):
+    occupied = gs.occupied
+    rest = occupied & (occupied - 1)
+    rest &= rest - 1
+    if not rest or rest & (rest - 1): # not exactly three pieces
+        return None
+    pieces = gs.bitboards
+    for piece in BITBASE_PIECES:
+        for strongColor in "wb":
+            if pieces[strongColor + piece]:
+                table = getBitbase(piece)
+                if table is None:
+                    return None
+                weakColor = 'b' if strongColor == 'w' else 'w'
+                flip = 0 if strongColor == 'w' else 56 # row 7 - row
+                index = bitbaseIndex(STRONG_TO_MOVE if gs.whiteToMove == (strongColor == 'w') else WEAK_TO_MOVE,
+                                     (pieces[strongColor + 'K'].bit_length() - 1) ^ flip,
+                                     (pieces[weakColor + 'K'].bit_length() - 1) ^ flip,
+                                     (pieces[strongColor + piece].bit_length() - 1) ^ flip)
+                if not table.isWin(index):
+                    return 0
+                return 1 if index >> 18 == STRONG_TO_MOVE else -1
+    return None
+
+'''
+Command line entry point: generate the tables.
+'''
+def main():
+    parser = argparse.ArgumentParser(description = "Generate the KQK, KRK and KPK endgame bitbases.")
+    parser.parse_args()
+    os.makedirs(BITBASE_DIR, exist_ok = True)
+    for piece in BITBASE_PIECES:
+        start = time.perf_counter()
+        queenTable = getBitbase('Q') if piece == 'P' else None
+        bits = generate(piece, queenTable)
+        with open(bitbasePath(piece), "wb") as bitbaseFile:
+            bitbaseFile.write(bits)
+        loadedBitbases.pop(piece, None)
+        wins = sum(bin(byte).count("1") for byte in bits)
+        print(f"k{piece.lower()}k: {wins} won positions, {time.perf_counter() - start:.1f}s -> {bitbasePath(piece)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+'''
+EPD test-suite runner: streams the positions of an EPD file through the search at a fixed depth or time per move
+and reports how many it solved, the total nodes and how many positions per second it got through.
+A position counts as solved when the move found is one of its "bm" (best move) moves and none of its "am" (avoid move) moves.
+Run it from this folder:
+    python ChessEPD.py suite.epd                      -> depth 4 per position
+    python ChessEPD.py suite.epd --movetime 1000 --workers 8
+    python ChessEPD.py suite.epd --depth 5 --limit 100 --verbose
+'''
+
+import argparse
+import multiprocessing
+import time
+import ChessEngine, ChessAI
+
+'''
+Split one EPD line into (FEN, operations). The operations map an opcode to its operands, e.g. {"bm": ["Qg6"], "id": ["WAC.001"]}.
+Returns None for blank lines and comments.
+'''
+def parseEPD(line):
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("EPD line needs at least 4 fields: " + line)
+    operations = {}
+    for operation in (fields[4] if len(fields) > 4 else "").split(";"):
+        operation = operation.strip()
+        if operation:
+            parts = operation.split(None, 1)
+            operands = parts[1] if len(parts) > 1 else ""
+            if operands.startswith('"'): # a quoted string is a single operand
+                operations[parts[0]] = [operands.strip('"')]
+            else:
+                operations[parts[0]] = operands.split()
+    return " ".join(fields[:4]), operations
+
+'''
+Read the positions of an EPD file one at a time, so a suite of any size is never held in memory.
+'''
+def readEPD(path, limit = None):
+    count = 0
+    with open(path) as epdFile:
+        for line in epdFile:
+            if limit is not None and count >= limit:
+                return
+            position = parseEPD(line)
+            if position is not None:
+                count += 1
+                yield position
+
+'''
+Search one EPD position from an empty transposition table.
+Returns (id, solved or None if the position has no bm/am, move found, nodes, seconds).
+'''
+def solvePosition(task):
+    (fen, operations), maxDepth, timeLimit = task
+    gs = ChessEngine.GameState.fromFEN(fen)
+    ChessAI.transpositionTable.clear()
+    ChessAI.historyTable.clear()
+    search = ChessAI.SearchContext(maxDepth, timeLimit)
+    start = time.perf_counter()
+    ChessAI.iterativeDeepening(gs, gs.getValidMoves(), search)
+    seconds = time.perf_counter() - start
+    move = search.bestMove
+    solved = None
+    if "bm" in operations or "am" in operations:
+        bestMoves = [gs.parseSAN(san) for san in operations.get("bm", [])]
+        avoidMoves = [gs.parseSAN(san) for san in operations.get("am", [])]
+        solved = move is not None and ("bm" not in operations or move in bestMoves) and move not in avoidMoves
+    positionID = operations.get("id", [fen])[0]
+    return positionID, solved, str(move) if move is not None else "-", search.nodes, seconds
+
+'''
+Run every position of the suite, print the results and return the number solved.
+With more than one worker the positions are shared out over a process pool, each worker with its own transposition table.
+'''
+def runSuite(path, maxDepth = None, timeLimit = None, workers = 1, limit = None, verbose = False):
+    tasks = ((position, maxDepth, timeLimit) for position in readEPD(path, limit))
+    positions = solvedCount = scoredCount = totalNodes = 0
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        results = pool.imap(solvePosition, tasks, chunksize = 1) if pool else map(solvePosition, tasks)
+        for positionID, solved, move, nodes, seconds in results:
+            positions += 1
+            totalNodes += nodes
+            if solved is not None:
+                scoredCount += 1
+                solvedCount += solved
+            if verbose:
+                status = "    " if solved is None else "ok  " if solved else "FAIL"
+                print(f"{status} {positionID:24} {move:7} nodes {nodes:>8}  {seconds:6.2f}s")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    seconds = time.perf_counter() - start
+    print(f"solved {solvedCount}/{scoredCount} ({100 * solvedCount / max(scoredCount, 1):.1f}%), "
+          f"{positions} positions, {totalNodes} nodes in {seconds:.2f}s, "
+          f"{positions / max(seconds, 1e-9):.2f} positions/s, {totalNodes / max(seconds, 1e-9):.0f} nps")
+    return solvedCount
+
+'''
+Command line entry point.
+'''
+def main():
+    parser = argparse.ArgumentParser(description = "Run an EPD test suite through the search.")
+    parser.add_argument("epd", help = "EPD file with bm/am operations")
+    parser.add_argument("--depth", type = int, help = "search depth per position (default 4 if no --movetime)")
+    parser.add_argument("--movetime", type = int, help = "milliseconds per position")
+    parser.add_argument("--workers", type = int, default = 1, help = "processes to share the positions over")
+    parser.add_argument("--limit", type = int, help = "only run the first N positions")
+    parser.add_argument("--verbose", action = "store_true", help = "print the result of every position")
+    args = parser.parse_args()
+    timeLimit = args.movetime / 1000 if args.movetime is not None else None
+    maxDepth = args.depth if args.depth is not None or timeLimit is not None else 4
+    runSuite(args.epd, maxDepth, timeLimit, args.workers, args.limit, args.verbose)
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,157 @@ This module is responsible for all the information about the current state of a
 It will also be responsible for determining the valid moves at the current state.
 '''
 
+import random
+
+# Bitboards: every square is one bit of a 64-bit int, square index = row * 8 + col.
+# a8 is bit 0 and h1 is bit 63, so the (row, col) convention of the board list still holds.
+KNIGHT_OFFSETS = ((-2, -1), (-1, -2), (1, -2), (2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1)) # up, left, down, right
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1)) # 4 diagonals
+
+'''
+For every square, the bitboard of squares reached by jumping with the given (row, col) offsets.
+'''
+def buildLeaperAttacks(offsets):
+    attacks = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for dRow, dCol in offsets:
+            endRow, endCol = row + dRow, col + dCol
+            if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
+                bb |= 1 << (endRow * 8 + endCol)
+        attacks.append(bb)
+    return attacks
+
+'''
+For every square, the bitboard of squares on an empty board going from it in one direction (excluding itself).
+'''
+def buildRays(direction):
+    rays = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for i in range(1, 8):
+            endRow, endCol = row + direction[0] * i, col + direction[1] * i
+            if not (0 <= endRow < 8 and 0 <= endCol < 8): # off board
+                break
+            bb |= 1 << (endRow * 8 + endCol)
+        rays.append(bb)
+    return rays
+
+KNIGHT_ATTACKS = buildLeaperAttacks(KNIGHT_OFFSETS)
+KING_ATTACKS = buildLeaperAttacks(KING_OFFSETS)
+# squares attacked by a pawn of the given color standing on a square
+PAWN_ATTACKS = {'w': buildLeaperAttacks(((-1, -1), (-1, 1))), 'b': buildLeaperAttacks(((1, -1), (1, 1)))}
+# (rays, increasing) pairs, increasing is True when the ray goes towards higher square indexes
+ROOK_RAYS = [(buildRays(d), d[0] * 8 + d[1] > 0) for d in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(buildRays(d), d[0] * 8 + d[1] > 0) for d in BISHOP_DIRECTIONS]
+
+'''
+BETWEEN[a][b] is the bitboard of squares strictly between a and b when they share a rank, file or diagonal, else 0.
+'''
+def buildBetween():
+    between = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        for dRow, dCol in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            bb = 0
+            for i in range(1, 8):
+                endRow, endCol = row + dRow * i, col + dCol * i
+                if not (0 <= endRow < 8 and 0 <= endCol < 8): # off board
+                    break
+                between[sq][endRow * 8 + endCol] = bb
+                bb |= 1 << (endRow * 8 + endCol)
+    return between
+
+BETWEEN = buildBetween()
+ALL_SQUARES = (1 << 64) - 1
+
+'''
+Squares attacked by a slider on sq along the given rays. The first blocker in each direction is included.
+'''
+def slidingAttacks(sq, occupied, rays):
+    attacks = 0
+    for ray, increasing in rays:
+        bb = ray[sq]
+        blockers = bb & occupied
+        if blockers:
+            # nearest blocker is the lowest bit on increasing rays and the highest bit otherwise
+            if increasing:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            bb ^= ray[blocker] # cut off everything behind the blocker
+        attacks |= bb
+    return attacks
+
+'''
+Rook attacks from sq given the occupancy bitboard.
+'''
+def rookAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, ROOK_RAYS)
+
+'''
+Bishop attacks from sq given the occupancy bitboard.
+'''
+def bishopAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, BISHOP_RAYS)
+
+# lines a rook or bishop covers from each square on an empty board, for cheap "is anything aligned" tests
+ROOK_LINES = [rookAttacks(sq, 0) for sq in range(64)]
+BISHOP_LINES = [bishopAttacks(sq, 0) for sq in range(64)]
+
+'''
+Check whether the nearest piece along any of the rays from sq is one of the given sliders.
+Walks outward from the target square and stops at the first slider found.
+'''
+def sliderOnRays(sq, occupied, rays, sliders):
+    for ray, increasing in rays:
+        blockers = ray[sq] & occupied
+        if blockers:
+            if increasing:
+                nearest = blockers & -blockers
+            else:
+                nearest = 1 << (blockers.bit_length() - 1)
+            if nearest & sliders:
+                return True
+    return False
+
+# Zobrist keys: a position's key is the XOR of one random 64-bit number per piece on its square,
+# one for black to move, one per castling rights combination and one per en passant file.
+# The seed is fixed so every process computes the same keys for the same position.
+zobristRandom = random.Random(20240517)
+ZOBRIST_PIECES = {color + piece: [zobristRandom.getrandbits(64) for _ in range(64)] for color in "wb" for piece in "PRNBQK"}
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+ZOBRIST_CASTLE_RIGHTS = [zobristRandom.getrandbits(64) for _ in range(4)] # wks, wqs, bks, bqs
+# key for every combination of the 4 castling rights, indexed by wks | wqs << 1 | bks << 2 | bqs << 3
+ZOBRIST_CASTLING = [0] * 16
+for rightsIndex in range(16):
+    for i in range(4):
+        if rightsIndex >> i & 1:
+            ZOBRIST_CASTLING[rightsIndex] ^= ZOBRIST_CASTLE_RIGHTS[i]
+ZOBRIST_EN_PASSANT_FILE = [zobristRandom.getrandbits(64) for _ in range(8)]
+
+# Evaluation tables behind the running material and piece-square totals that GameState keeps for each side.
+# PIECE_VALUES is indexed by piece type, PIECE_SQUARE_VALUES by piece and square (black reads the tables mirrored).
+# They start out empty (every score 0); ChessAI installs its tables with setEvaluationTables when it is imported.
+PIECE_VALUES = {piece: 0 for piece in "PRNBQK"}
+PIECE_SQUARE_VALUES = {color + piece: [0] * 64 for color in "wb" for piece in "PRNBQK"}
+
+'''
+Install the piece values and the piece-square tables (8x8, from white's point of view) used for the running scores.
+GameStates that already exist keep their totals until refreshScores is called.
+'''
+def setEvaluationTables(piecesScore, piecePositionScores):
+    for piece, value in piecesScore.items():
+        PIECE_VALUES[piece] = value
+    for piece, table in piecePositionScores.items():
+        whiteValues = [table[sq // 8][sq % 8] for sq in range(64)]
+        PIECE_SQUARE_VALUES['w' + piece] = whiteValues
+        PIECE_SQUARE_VALUES['b' + piece] = [whiteValues[63 - sq] for sq in range(64)] # row 7 - r, col 7 - c
+
 '''
 This class is responsible for stating all the information about the current chess game. 
 It will also responsible for the valid moves at the current state. It will also keep a move log. 
@@ -23,6 +174,11 @@ class GameState():
             ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
         ]
+        # Bitboards are the representation used for move generation and evaluation,
+        # the board list above is kept in sync as a view for drawing and for building Move objects.
+        self.setupBitboards()
+        # running material and piece-square totals for each side, updated by makeMove/undoMove
+        self.refreshScores()
 
         self.moveFunctions = {'P': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves,
                                'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
@@ -38,11 +194,312 @@ class GameState():
         self.currentCastlingRights = CastleRights(True, True, True, True)
         self.castleRightsLog = [CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
                                              self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)]
+        # Zobrist key of the position, updated by makeMove and restored from the log by undoMove
+        self.zobristKey = self.computeZobristKey()
+        self.zobristKeyLog = [self.zobristKey]
+        # move counters as in FEN: half moves since the last capture or pawn move (fifty-move rule), and the move number
+        self.halfmoveClock = 0
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = 1
+
+    '''
+    Build a GameState from a FEN string (piece placement, side to move, castling rights, en passant square,
+    half move clock and full move number). The last four fields can be left out, as in EPD.
+    Anything that can't be played from raises ValueError: no king or two of one color, a pawn on the first or last rank,
+    the side not to move in check, a bad side to move or en passant square. Castling rights without the king and rook
+    on their squares and an en passant square without the pawn that just moved past it are dropped.
+    '''
+    @classmethod
+    def fromFEN(cls, fen):
+        gs = cls()
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError("FEN needs at least the piece placement and the side to move: " + fen)
+        board = []
+        for rowText in fields[0].split('/'):
+            row = []
+            for char in rowText:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                elif char.upper() in "PRNBQK":
+                    row.append(('w' if char.isupper() else 'b') + char.upper())
+                else:
+                    raise ValueError("Unknown piece '" + char + "' in FEN: " + fen)
+            board.append(row)
+        if len(board) != 8 or any(len(row) != 8 for row in board):
+            raise ValueError("FEN piece placement is not 8x8: " + fen)
+        for king in ('wK', 'bK'):
+            if sum(row.count(king) for row in board) != 1:
+                raise ValueError("FEN needs exactly one king of each color: " + fen)
+        if any(piece[1] == 'P' for piece in board[0] + board[7]):
+            raise ValueError("FEN has a pawn on the first or last rank: " + fen)
+        gs.board = board
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] == 'wK':
+                    gs.whiteKingLocation = (row, col)
+                elif board[row][col] == 'bK':
+                    gs.blackKingLocation = (row, col)
+        if fields[1] not in ('w', 'b'):
+            raise ValueError("FEN side to move must be w or b: " + fen)
+        gs.whiteToMove = fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        # keep only the rights whose king and rook still stand where they started
+        homeSquares = (('K', 7, 7, 'w'), ('Q', 7, 0, 'w'), ('k', 0, 7, 'b'), ('q', 0, 0, 'b')) # right, row, rook column
+        castling = "".join(right for right, row, col, color in homeSquares
+                           if right in castling and board[row][4] == color + 'K' and board[row][col] == color + 'R')
+        gs.currentCastlingRights = CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)
+        gs.castleRightsLog = [CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)]
+        enPassant = fields[3] if len(fields) > 3 else '-'
+        if enPassant != '-':
+            # the square the pawn skipped: on the 6th rank when white can take, on the 3rd when black can
+            if len(enPassant) != 2 or enPassant[0] not in "abcdefgh" or enPassant[1] != ('6' if gs.whiteToMove else '3'):
+                raise ValueError("FEN en passant square is not valid: " + fen)
+            epRow, epCol = Move.ranksToRows[enPassant[1]], Move.filesToCols[enPassant[0]]
+            pawnRow, startRow = (epRow + 1, epRow - 1) if gs.whiteToMove else (epRow - 1, epRow + 1)
+            pushedPawn = 'bP' if gs.whiteToMove else 'wP'
+            # only after a double step: the pawn past the square, the square and the one it came from empty
+            if board[pawnRow][epCol] == pushedPawn and board[epRow][epCol] == "--" and board[startRow][epCol] == "--":
+                gs.enPassantPossible = (epRow, epCol)
+        gs.enPassantPossibleLog = [gs.enPassantPossible]
+        try:
+            gs.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            gs.fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("FEN move counters are not numbers: " + fen)
+        gs.halfmoveClockLog = [gs.halfmoveClock]
+        gs.setupBitboards()
+        waitingKing = gs.blackKingLocation if gs.whiteToMove else gs.whiteKingLocation
+        if gs.isSquareAttacked(waitingKing[0] * 8 + waitingKing[1], 'w' if gs.whiteToMove else 'b', gs.occupied):
+            raise ValueError("FEN has the side not to move in check: " + fen)
+        gs.refreshScores()
+        gs.zobristKey = gs.computeZobristKey()
+        gs.zobristKeyLog = [gs.zobristKey]
+        return gs
+
+    '''
+    The FEN string of the current position, the inverse of fromFEN.
+    The en passant square is written after every double pawn push, whether a capture is possible or not.
+    '''
+    def toFEN(self):
+        rows = []
+        for row in self.board:
+            rowText = ""
+            emptySquares = 0
+            for piece in row:
+                if piece == "--":
+                    emptySquares += 1
+                    continue
+                if emptySquares:
+                    rowText += str(emptySquares)
+                    emptySquares = 0
+                rowText += piece[1] if piece[0] == 'w' else piece[1].lower()
+            if emptySquares:
+                rowText += str(emptySquares)
+            rows.append(rowText)
+        rights = self.currentCastlingRights
+        castling = ('K' if rights.wks else '') + ('Q' if rights.wqs else '') + \
+                   ('k' if rights.bks else '') + ('q' if rights.bqs else '')
+        enPassant = Move.colsToFiles[self.enPassantPossible[1]] + Move.rowsToRanks[self.enPassantPossible[0]] \
+                    if self.enPassantPossible else '-'
+        return " ".join(["/".join(rows), 'w' if self.whiteToMove else 'b', castling or '-', enPassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)])
+
+    '''
+    Find the legal move written in standard algebraic notation (e.g. e4, exd5, Nbd7, R1e2, e8=Q+, O-O) in this
+    position, or None if there is none. Check, mate and annotation marks are ignored, and so is the promotion
+    piece since pawns always promote to a queen.
+    '''
+    def parseSAN(self, san):
+        san = san.rstrip("+#!?").replace("0", "O")
+        if "=" in san:
+            san = san[:san.index("=")]
+        elif len(san) > 2 and san[-1] in "QRBNqrbn" and san[-2].isdigit(): # promotion written without '='
+            san = san[:-1]
+        validMoves = self.getValidMoves()
+        if san in ("O-O", "O-O-O"):
+            for move in validMoves:
+                if move.isCastleMove and (move.endCol == 6) == (san == "O-O"):
+                    return move
+            return None
+        if len(san) < 2 or san[-2] not in Move.filesToCols or san[-1] not in Move.ranksToRows:
+            return None
+        endRow, endCol = Move.ranksToRows[san[-1]], Move.filesToCols[san[-2]]
+        piece = san[0] if san[0] in "KQRBN" else 'P'
+        hints = san[1 if piece != 'P' else 0:-2].replace("x", "") # disambiguation: file, rank or both
+        matches = []
+        for move in validMoves:
+            if move.endRow != endRow or move.endCol != endCol or move.pieceMoved[1] != piece:
+                continue
+            startSquare = move.getRankFile(move.startRow, move.startCol)
+            if all(hint in startSquare for hint in hints):
+                matches.append(move)
+        return matches[0] if len(matches) == 1 else None
+
+    '''
+    Full standard algebraic notation of a legal move in this position, as PGN readers expect it:
+    Move.__str__ plus the file/rank needed to tell two identical pieces apart, "=Q" on promotions and "+"/"#".
+    '''
+    def getSAN(self, move):
+        san = str(move)
+        if move.pieceMoved[1] not in "PK":
+            others = [other for other in self.getValidMoves() if other.pieceMoved == move.pieceMoved and
+                      other.endRow == move.endRow and other.endCol == move.endCol and other != move]
+            if others:
+                if all(other.startCol != move.startCol for other in others):
+                    hint = move.colsToFiles[move.startCol]
+                elif all(other.startRow != move.startRow for other in others):
+                    hint = move.rowsToRanks[move.startRow]
+                else:
+                    hint = move.getRankFile(move.startRow, move.startCol)
+                san = san[0] + hint + san[1:]
+        if move.isPawnPromotion:
+            san += "=Q"
+        self.makeMove(move)
+        if self.inCheck():
+            san += "#" if len(self.getValidMoves()) == 0 else "+"
+        self.undoMove()
+        return san
+
+    '''
+    Build the bitboards (one per piece, one per color and the total occupancy) from the board list.
+    '''
+    def setupBitboards(self):
+        self.bitboards = {color + piece: 0 for color in "wb" for piece in "PRNBQK"}
+        self.colorBitboards = {'w': 0, 'b': 0}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    self.bitboards[piece] |= 1 << (row * 8 + col)
+                    self.colorBitboards[piece[0]] |= 1 << (row * 8 + col)
+        self.occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+
+    '''
+    Recompute the material and piece-square totals of both sides from the bitboards.
+    '''
+    def refreshScores(self):
+        self.materialScore = {'w': 0, 'b': 0}
+        self.positionScore = {'w': 0, 'b': 0}
+        for piece, bb in self.bitboards.items():
+            while bb:
+                lowestBit = bb & -bb
+                bb ^= lowestBit
+                self.materialScore[piece[0]] += PIECE_VALUES[piece[1]]
+                self.positionScore[piece[0]] += PIECE_SQUARE_VALUES[piece][lowestBit.bit_length() - 1]
+
+    '''
+    Add the score changes of a move to the running totals (sign = 1), or take them back (sign = -1).
+    '''
+    def updateScores(self, move, sign):
+        color = move.pieceMoved[0]
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        if move.isPawnPromotion:
+            placedPiece = color + 'Q'
+            self.materialScore[color] += sign * (PIECE_VALUES['Q'] - PIECE_VALUES['P'])
+        else:
+            placedPiece = move.pieceMoved
+        self.positionScore[color] += sign * (PIECE_SQUARE_VALUES[placedPiece][endSq] - PIECE_SQUARE_VALUES[move.pieceMoved][startSq])
+        if move.pieceCaptured != "--":
+            capturedSq = move.startRow * 8 + move.endCol if move.isEnpassantMove else endSq
+            enemyColor = move.pieceCaptured[0]
+            self.materialScore[enemyColor] -= sign * PIECE_VALUES[move.pieceCaptured[1]]
+            self.positionScore[enemyColor] -= sign * PIECE_SQUARE_VALUES[move.pieceCaptured][capturedSq]
+        if move.isCastleMove:
+            rookValues = PIECE_SQUARE_VALUES[color + 'R']
+            if move.endCol - move.startCol == 2: # KingSide castle
+                self.positionScore[color] += sign * (rookValues[endSq - 1] - rookValues[endSq + 1])
+            else: # QueenSide castle
+                self.positionScore[color] += sign * (rookValues[endSq + 1] - rookValues[endSq - 2])
+
+    '''
+    Toggle the bits of a piece on the given squares in its piece and color bitboards.
+    '''
+    def togglePiece(self, piece, squareBits):
+        self.bitboards[piece] ^= squareBits
+        self.colorBitboards[piece[0]] ^= squareBits
+
+    '''
+    Apply the bitboard changes of a move. Every change is a XOR, so calling this again undoes the move.
+    '''
+    def toggleMoveBitboards(self, move):
+        startBit = 1 << (move.startRow * 8 + move.startCol)
+        endBit = 1 << (move.endRow * 8 + move.endCol)
+        if move.isPawnPromotion:
+            self.togglePiece(move.pieceMoved, startBit)
+            self.togglePiece(move.pieceMoved[0] + 'Q', endBit)
+        else:
+            self.togglePiece(move.pieceMoved, startBit | endBit)
+        if move.isEnpassantMove:
+            self.togglePiece(move.pieceCaptured, 1 << (move.startRow * 8 + move.endCol))
+        elif move.pieceCaptured != "--":
+            self.togglePiece(move.pieceCaptured, endBit)
+        if move.isCastleMove:
+            endSq = move.endRow * 8 + move.endCol
+            if move.endCol - move.startCol == 2: # KingSide castle, rook jumps from the right of the king to its left
+                self.togglePiece(move.pieceMoved[0] + 'R', (1 << (endSq + 1)) | (1 << (endSq - 1)))
+            else: # QueenSide castle, rook jumps from two squares left of the king to its right
+                self.togglePiece(move.pieceMoved[0] + 'R', (1 << (endSq - 2)) | (1 << (endSq + 1)))
+        self.occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+
+    '''
+    Compute the Zobrist key of the current position from scratch.
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for piece, bb in self.bitboards.items():
+            while bb:
+                lowestBit = bb & -bb
+                bb ^= lowestBit
+                key ^= ZOBRIST_PIECES[piece][lowestBit.bit_length() - 1]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key ^ self.castleEnPassantKey()
+
+    '''
+    The part of the Zobrist key coming from the castling rights and the en passant file.
+    The en passant file only counts when a pawn of the side to move can actually capture there,
+    so positions that only differ by an unusable en passant square get the same key.
+    '''
+    def castleEnPassantKey(self):
+        rights = self.currentCastlingRights
+        key = ZOBRIST_CASTLING[rights.wks | rights.wqs << 1 | rights.bks << 2 | rights.bqs << 3]
+        if self.enPassantPossible:
+            row, col = self.enPassantPossible
+            allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+            if PAWN_ATTACKS[enemyColor][row * 8 + col] & self.bitboards[allyColor + 'P']:
+                key ^= ZOBRIST_EN_PASSANT_FILE[col]
+        return key
+
+    '''
+    XOR of the Zobrist piece keys of every piece the move takes off or puts on a square.
+    '''
+    def moveZobristDelta(self, move):
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        placedPiece = move.pieceMoved[0] + 'Q' if move.isPawnPromotion else move.pieceMoved
+        delta = ZOBRIST_PIECES[move.pieceMoved][startSq] ^ ZOBRIST_PIECES[placedPiece][endSq]
+        if move.isEnpassantMove:
+            delta ^= ZOBRIST_PIECES[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        elif move.pieceCaptured != "--":
+            delta ^= ZOBRIST_PIECES[move.pieceCaptured][endSq]
+        if move.isCastleMove:
+            rookKeys = ZOBRIST_PIECES[move.pieceMoved[0] + 'R']
+            if move.endCol - move.startCol == 2: # KingSide castle
+                delta ^= rookKeys[endSq + 1] ^ rookKeys[endSq - 1]
+            else: # QueenSide castle
+                delta ^= rookKeys[endSq - 2] ^ rookKeys[endSq + 1]
+        return delta
 
     '''
     Takes a Move as a parameter and executes it (this will not work for castling, pawn promotion, and en-passant).
     '''
     def makeMove(self, move):
+        # take out the old castling/en passant part of the key, it is added back once they are updated
+        newKey = self.zobristKey ^ self.castleEnPassantKey() ^ self.moveZobristDelta(move) ^ ZOBRIST_BLACK_TO_MOVE
+        self.toggleMoveBitboards(move)
+        self.updateScores(move, 1)
         self.board[move.startRow][move.startCol] = "--"
         self.board[move.endRow][move.endCol] = move.pieceMoved
         self.moveLog.append(move) # log the move so we can undo it later
@@ -80,12 +537,52 @@ class GameState():
 
         self.enPassantPossibleLog.append(self.enPassantPossible)
 
+        # update castling rights - whenever it is a rook or king move (or a rook gets captured)
+        self.updateCastleRights(move)
+        self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
+                                                 self.currentCastlingRights.wqs, self.currentCastlingRights.bqs))
+
+        self.zobristKey = newKey ^ self.castleEnPassantKey()
+        self.zobristKeyLog.append(self.zobristKey)
+
+        # move counters: captures and pawn moves reset the half move clock, the move number goes up after black's move
+        if move.pieceMoved[1] == 'P' or move.pieceCaptured != "--":
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if move.pieceMoved[0] == 'b':
+            self.fullmoveNumber += 1
+
+    '''
+    Pass the turn without moving, for null move pruning in the search: only the side to move changes and the
+    en passant square is gone. It is logged as None, so undoMove takes it back like any other move.
+    Never made in check, the side passing would leave its king in check.
+    '''
+    def makeNullMove(self):
+        newKey = self.zobristKey ^ self.castleEnPassantKey() ^ ZOBRIST_BLACK_TO_MOVE
+        self.moveLog.append(None)
+        self.whiteToMove = not self.whiteToMove
+        self.enPassantPossible = ()
+        self.enPassantPossibleLog.append(self.enPassantPossible)
+        self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
+                                                 self.currentCastlingRights.wqs, self.currentCastlingRights.bqs))
+        self.zobristKey = newKey ^ self.castleEnPassantKey()
+        self.zobristKeyLog.append(self.zobristKey)
+        self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+
     '''
     Undo the last move made.
     ''' 
     def undoMove(self):
         if len(self.moveLog) != 0: # make sure that there is a move to undo
             move = self.moveLog.pop()
+            if move is None: # a null move
+                self.undoNullMove()
+                return
+            self.toggleMoveBitboards(move)
+            self.updateScores(move, -1)
             self.board[move.startRow][move.startCol] = move.pieceMoved
             self.board[move.endRow][move.endCol] = move.pieceCaptured
             self.whiteToMove = not self.whiteToMove  # swap players back
@@ -113,10 +610,39 @@ class GameState():
                     self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
                     self.board[move.endRow][move.endCol + 1] = "--"
 
+            # undo castling rights
+            self.castleRightsLog.pop()
+            lastRights = self.castleRightsLog[-1]
+            self.currentCastlingRights = CastleRights(lastRights.wks, lastRights.bks, lastRights.wqs, lastRights.bqs)
+
+            self.zobristKeyLog.pop()
+            self.zobristKey = self.zobristKeyLog[-1]
+
+            # undo the move counters
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+            if move.pieceMoved[0] == 'b':
+                self.fullmoveNumber -= 1
+
             # reset the checkmate and stalemate flags
             self.checkMate = False
             self.staleMate = False
 
+    '''
+    Take back a null move, whose None entry undoMove has already taken off the move log.
+    '''
+    def undoNullMove(self):
+        self.whiteToMove = not self.whiteToMove
+        self.enPassantPossibleLog.pop()
+        self.enPassantPossible = self.enPassantPossibleLog[-1]
+        self.castleRightsLog.pop()
+        self.zobristKeyLog.pop()
+        self.zobristKey = self.zobristKeyLog[-1]
+        self.halfmoveClockLog.pop()
+        self.halfmoveClock = self.halfmoveClockLog[-1]
+        self.checkMate = False
+        self.staleMate = False
+
     '''
     Update the castle rights given the move.
     '''
@@ -154,32 +680,74 @@ class GameState():
                 elif move.endCol == 7:
                     self.currentCastlingRights.bks = False
 
+    '''
+    Checkers and pins of the side to move, as (kingSq, checkers bitboard, pinRays).
+    pinRays maps the square of every pinned piece to the squares it may still move to:
+    the line between its king and the pinning piece, the pinning piece included.
+    '''
+    def getChecksAndPins(self):
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        kingSq = self.bitboards[allyColor + 'K'].bit_length() - 1
+        checkers = self.getAttackers(kingSq, enemyColor, self.occupied)
+
+        # pinned pieces: exactly one friendly piece between the king and an enemy slider looking at it
+        enemyQueens = self.bitboards[enemyColor + 'Q']
+        snipers = (ROOK_LINES[kingSq] & (self.bitboards[enemyColor + 'R'] | enemyQueens)) | \
+                  (BISHOP_LINES[kingSq] & (self.bitboards[enemyColor + 'B'] | enemyQueens))
+        pinRays = {}
+        while snipers:
+            sniperBit = snipers & -snipers
+            snipers ^= sniperBit
+            sniperSq = sniperBit.bit_length() - 1
+            blockers = BETWEEN[kingSq][sniperSq] & self.occupied
+            if blockers and not blockers & (blockers - 1) and blockers & self.colorBitboards[allyColor]:
+                pinRays[blockers.bit_length() - 1] = BETWEEN[kingSq][sniperSq] | sniperBit
+        return kingSq, checkers, pinRays
+
     '''
     All moves considering checks.
+    Checkers and pinned pieces are found once from the king's square, so every generated move is already legal:
+    - in double check only the king may move,
+    - in single check the other pieces may only capture the checker or block the checking ray,
+    - a pinned piece may only move along the line between its king and the pinning piece,
+    - the king may not step onto an attacked square (looked up with the king removed, so it can't hide behind itself),
+    - en passant is verified on its own because it removes two pieces from the capturing pawn's rank.
     '''
     def getValidMoves(self):
-        tempEnPassantPossible = self.enPassantPossible
-        tempCastleRights = CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
-                                        self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)
-        # Generate all possible moves
-        moves = self.getAllPossibleMoves()
-        if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-        else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
-        # For each move, make the move
-        for i in range(len(moves)-1, -1, -1): # when removing from a list, go backwards
-            self.makeMove(moves[i])
-            # Generate all opponent's moves
-            # For each of opponent's moves, see if they attack your king
-            self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                moves.remove(moves[i]) # If they do attack your king, not a valid move
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        kingSq, checkers, pinRays = self.getChecksAndPins()
+        kingBit = 1 << kingSq
+
+        moves = []
+        if not checkers & (checkers - 1): # not a double check, pieces other than the king can move
+            if checkers:
+                checkerSq = checkers.bit_length() - 1
+                allowed = checkers | BETWEEN[kingSq][checkerSq] # capture the checker or block it
+            else:
+                allowed = ALL_SQUARES
+            ownPieces = self.colorBitboards[allyColor] ^ kingBit
+            while ownPieces: # visit the pieces in board order, a8 to h1
+                lowestBit = ownPieces & -ownPieces
+                ownPieces ^= lowestBit
+                sq = lowestBit.bit_length() - 1
+                row, col = sq >> 3, sq & 7
+                self.moveFunctions[self.board[row][col][1]](row, col, moves, allowed & pinRays.get(sq, ALL_SQUARES))
+
+        # king steps, the king's own square is removed from the occupancy so sliders see through it
+        targets = KING_ATTACKS[kingSq] & ~self.colorBitboards[allyColor]
+        occupiedWithoutKing = self.occupied ^ kingBit
+        while targets:
+            lowestBit = targets & -targets
+            targets ^= lowestBit
+            sq = lowestBit.bit_length() - 1
+            if not self.isSquareAttacked(sq, enemyColor, occupiedWithoutKing):
+                moves.append(Move((kingRow, kingCol), (sq >> 3, sq & 7), self.board))
+        if not checkers:
+            self.getCastleMoves(kingRow, kingCol, moves)
 
         if len(moves) == 0: # either checkmate or stalemate
-            if self.inCheck():
+            if checkers:
                 self.checkMate = True
             else:
                 self.staleMate = True
@@ -187,11 +755,131 @@ class GameState():
             self.checkMate = False
             self.staleMate = False
 
-        self.enPassantPossible = tempEnPassantPossible
-        self.currentCastlingRights = tempCastleRights
-
         return moves
     
+    '''
+    Legal captures, en passant and promotions only, for quiescence search. Nothing else is generated.
+    The moves come out in MVV-LVA order: promotions first, then the captures of the most valuable victims,
+    each victim taken by its least valuable attacker first.
+    Delta pruning hook: victims worth less than minVictimValue (in PIECE_VALUES units) are not generated at all,
+    so a caller that knows a capture can't bring the score back up to alpha never pays for it. Promotions are always kept,
+    captures onto the last rank by a pawn included: the new queen is worth far more than any victim.
+    The checkmate/stalemate flags are left alone, a position without captures says nothing about them.
+    '''
+    def getCaptureMoves(self, minVictimValue = None):
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        kingSq, checkers, pinRays = self.getChecksAndPins()
+        kingBit = 1 << kingSq
+        if checkers & (checkers - 1): # double check, only the king may capture
+            allowed = 0
+        elif checkers:
+            allowed = checkers | BETWEEN[kingSq][checkers.bit_length() - 1]
+        else:
+            allowed = ALL_SQUARES
+        pieces = self.bitboards
+        occupiedWithoutKing = self.occupied ^ kingBit
+        moves = []
+
+        # promotions by pushing, a capture onto the last rank is a promotion too and comes with the captures
+        pawns = pieces[allyColor + 'P']
+        if self.whiteToMove:
+            pushes = ((pawns & 0xFF00) >> 8) & ~self.occupied & allowed # pawns on the 7th rank (row 1) going to row 0
+            step = 8
+        else:
+            pushes = ((pawns & (0xFF << 48)) << 8) & ~self.occupied & allowed
+            step = -8
+        while pushes:
+            lowestBit = pushes & -pushes
+            pushes ^= lowestBit
+            sq = lowestBit.bit_length() - 1
+            startSq = sq + step
+            if (pinRays.get(startSq, ALL_SQUARES) >> sq) & 1:
+                moves.append(Move((startSq >> 3, startSq & 7), (sq >> 3, sq & 7), self.board))
+
+        lastRank = 0xFF if self.whiteToMove else 0xFF << 56
+        for victim in "QRBNP":
+            targets = pieces[enemyColor + victim]
+            attackerKinds = "PNBRQK"
+            if minVictimValue is not None and PIECE_VALUES[victim] < minVictimValue:
+                # not worth it as a capture, only as a promotion
+                targets &= lastRank
+                attackerKinds = "P"
+            while targets:
+                targetBit = targets & -targets
+                targets ^= targetBit
+                sq = targetBit.bit_length() - 1
+                attackers = self.getAttackers(sq, allyColor)
+                for attacker in attackerKinds:
+                    fromSquares = attackers & pieces[allyColor + attacker]
+                    while fromSquares:
+                        fromBit = fromSquares & -fromSquares
+                        fromSquares ^= fromBit
+                        fromSq = fromBit.bit_length() - 1
+                        if attacker == 'K':
+                            if self.isSquareAttacked(sq, enemyColor, occupiedWithoutKing):
+                                continue
+                        elif not (allowed & pinRays.get(fromSq, ALL_SQUARES)) & targetBit:
+                            continue
+                        moves.append(Move((fromSq >> 3, fromSq & 7), (sq >> 3, sq & 7), self.board))
+
+        if self.enPassantPossible and (minVictimValue is None or PIECE_VALUES['P'] >= minVictimValue):
+            epRow, epCol = self.enPassantPossible
+            epSq = epRow * 8 + epCol
+            # own pawns standing where an enemy pawn on the ep square would attack
+            fromSquares = PAWN_ATTACKS[enemyColor][epSq] & pawns
+            while fromSquares:
+                fromBit = fromSquares & -fromSquares
+                fromSquares ^= fromBit
+                fromSq = fromBit.bit_length() - 1
+                if self.isEnPassantSafe(fromSq, epSq): # also covers pins and checks, the king is looked at directly
+                    moves.append(Move((fromSq >> 3, fromSq & 7), (epRow, epCol), self.board, isEnpassantPossible = True))
+        return moves
+
+    '''
+    Static exchange evaluation: the material the side to move wins (in PIECE_VALUES units) by playing the capture
+    and then letting both sides recapture on the target square with their least valuable attacker, each side
+    free to stop when recapturing would lose. Pieces that took part are lifted off the occupancy, so the attackers
+    lined up behind them (x-rays) join in. Pins are not looked at.
+    A pawn taking on the first or last rank promotes, so it also gains a queen for the pawn and stands there as a queen.
+    '''
+    def see(self, move):
+        toSq = move.endRow * 8 + move.endCol
+        fromSq = move.startRow * 8 + move.startCol
+        occupied = self.occupied ^ (1 << fromSq)
+        if move.isEnpassantMove:
+            occupied ^= 1 << (move.startRow * 8 + move.endCol)
+        gains = [PIECE_VALUES[move.pieceCaptured[1]] if move.pieceCaptured != "--" else 0]
+        pieceOnSquare = PIECE_VALUES[move.pieceMoved[1]]
+        if move.isPawnPromotion:
+            gains[0] += PIECE_VALUES['Q'] - PIECE_VALUES['P']
+            pieceOnSquare = PIECE_VALUES['Q']
+        side = 'b' if move.pieceMoved[0] == 'w' else 'w'
+        onBackRank = toSq < 8 or toSq >= 56 # only pawns moving forward reach it, so a pawn recapture there promotes
+        while True:
+            attackers = self.getAttackers(toSq, side, occupied)
+            if not attackers:
+                break
+            for piece in "PNBRQK": # least valuable attacker first
+                attackerBits = attackers & self.bitboards[side + piece]
+                if attackerBits:
+                    break
+            otherSide = 'b' if side == 'w' else 'w'
+            attackerBit = attackerBits & -attackerBits
+            if piece == 'K' and self.getAttackers(toSq, otherSide, occupied ^ attackerBit):
+                break # the king can't recapture onto a defended square
+            if piece == 'P' and onBackRank:
+                gains.append(pieceOnSquare + PIECE_VALUES['Q'] - PIECE_VALUES['P'] - gains[-1])
+                pieceOnSquare = PIECE_VALUES['Q']
+            else:
+                gains.append(pieceOnSquare - gains[-1])
+                pieceOnSquare = PIECE_VALUES[piece]
+            occupied ^= attackerBit
+            side = otherSide
+        # walk back: every side only goes on with the exchange if that is better than stopping
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
     ''' 
     Determine if the current player is in check.
     '''
@@ -205,141 +893,143 @@ class GameState():
     Determine if the enemy can attack the square row, col.
     '''
     def squareUnderAttack(self, row, col):
-        self.whiteToMove = not self.whiteToMove # switch to opponent's turn
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove # switch turns back
-        for move in oppMoves:
-            if move.endRow == row and move.endCol == col: # square is under attack
-                return True
-        return False
-    
+        return self.isSquareAttacked(row * 8 + col, 'b' if self.whiteToMove else 'w', self.occupied)
+
+    '''
+    Determine if any piece of byColor attacks sq, looking outward from sq instead of generating the enemy moves:
+    pawn diagonals, knight and king jumps, then the slider rays. Returns as soon as one attacker is found.
+    Pieces missing from the occupancy are ignored, like in getAttackers.
+    '''
+    def isSquareAttacked(self, sq, byColor, occupied):
+        pieces = self.bitboards
+        # a pawn of byColor attacks sq from where a pawn of the other color on sq would attack
+        if PAWN_ATTACKS['b' if byColor == 'w' else 'w'][sq] & pieces[byColor + 'P'] & occupied:
+            return True
+        if KNIGHT_ATTACKS[sq] & pieces[byColor + 'N'] & occupied:
+            return True
+        if KING_ATTACKS[sq] & pieces[byColor + 'K'] & occupied:
+            return True
+        queens = pieces[byColor + 'Q']
+        rooks = (pieces[byColor + 'R'] | queens) & occupied
+        if rooks & ROOK_LINES[sq] and sliderOnRays(sq, occupied, ROOK_RAYS, rooks):
+            return True
+        bishops = (pieces[byColor + 'B'] | queens) & occupied
+        return bool(bishops & BISHOP_LINES[sq]) and sliderOnRays(sq, occupied, BISHOP_RAYS, bishops)
+
+    '''
+    Bitboard of all the pieces of byColor that attack sq, with sliders blocked by the given occupancy
+    (the current one if not given). Used for check detection and for resolving exchanges on a square.
+    Pieces missing from the occupancy are ignored, which lets callers look at the board as it is after a move,
+    or with pieces that already took part in an exchange lifted off so the x-ray attackers behind them show up.
+    '''
+    def getAttackers(self, sq, byColor, occupied = None):
+        if occupied is None:
+            occupied = self.occupied
+        pieces = self.bitboards
+        queens = pieces[byColor + 'Q']
+        # a pawn of byColor attacks sq from where a pawn of the other color on sq would attack
+        return ((KNIGHT_ATTACKS[sq] & pieces[byColor + 'N'])
+                | (KING_ATTACKS[sq] & pieces[byColor + 'K'])
+                | (PAWN_ATTACKS['b' if byColor == 'w' else 'w'][sq] & pieces[byColor + 'P'])
+                | (rookAttacks(sq, occupied) & (pieces[byColor + 'R'] | queens))
+                | (bishopAttacks(sq, occupied) & (pieces[byColor + 'B'] | queens))) & occupied
+
+    '''
+    Check that capturing en passant from startSq onto epSq does not leave the own king attacked.
+    Both pawns leave the same rank, so this catches the discovered rank attack that pin detection can't see.
+    '''
+    def isEnPassantSafe(self, startSq, epSq):
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        capturedSq = (startSq & ~7) | (epSq & 7) # the captured pawn stands next to the capturing one
+        occupied = (self.occupied ^ (1 << startSq) ^ (1 << capturedSq)) | (1 << epSq)
+        kingSq = self.bitboards[allyColor + 'K'].bit_length() - 1
+        return not self.isSquareAttacked(kingSq, enemyColor, occupied)
+
     ''' 
     All moves without considering checks.
     '''
     def getAllPossibleMoves(self):
         moves = []
-        for row in range(len(self.board)): # number of rows '8'
-            for col in range(len(self.board[row])): # number of cols in given row '8'
-                turn = self.board[row][col][0]
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[row][col][1]
-                    self.moveFunctions[piece](row, col, moves) # call the appropriate move function based on piece type
+        ownPieces = self.colorBitboards['w' if self.whiteToMove else 'b']
+        while ownPieces: # visit the pieces in board order, a8 to h1
+            lowestBit = ownPieces & -ownPieces
+            ownPieces ^= lowestBit
+            sq = lowestBit.bit_length() - 1
+            row, col = sq >> 3, sq & 7
+            self.moveFunctions[self.board[row][col][1]](row, col, moves) # call the appropriate move function based on piece type
         return moves
-                    
+
+    '''
+    Add a move from (row, col) to every square set in the targets bitboard.
+    '''
+    def addMovesToTargets(self, row, col, targets, moves):
+        while targets:
+            lowestBit = targets & -targets
+            targets ^= lowestBit
+            sq = lowestBit.bit_length() - 1
+            moves.append(Move((row, col), (sq >> 3, sq & 7), self.board))
+
     ''' 
     Get all the pawn moves for the pawn located at row, col and add these moves to the list.
     '''
-    def getPawnMoves(self, row, col, moves):
-        if self.whiteToMove: # white pawn moves
-            if self.board[row-1][col] == "--": # 1 square move
-                moves.append(Move((row, col), (row-1, col), self.board))
-                if row == 6 and self.board[row-2][col] == "--": # 2 square move
-                    moves.append(Move((row, col), (row-2, col), self.board))
-            if col - 1 >= 0: # captures to the left
-                if self.board[row-1][col-1][0] == 'b': # enemy piece to capture
-                    moves.append(Move((row, col), (row-1, col-1), self.board))
-                elif (row-1, col-1) == self.enPassantPossible:
-                    moves.append(Move((row, col), (row-1, col-1), self.board, isEnpassantPossible = True))
-            if col + 1 <= 7: # captures to the right
-                if self.board[row-1][col+1][0] == 'b': # enemy piece to capture
-                    moves.append(Move((row, col), (row-1, col+1), self.board))
-                elif (row-1, col+1) == self.enPassantPossible:
-                    moves.append(Move((row, col), (row-1, col+1), self.board, isEnpassantPossible = True))
-    
-        else: # black pawn moves
-            if self.board[row+1][col] == "--": # 1 square move
-                moves.append(Move((row, col), (row+1, col), self.board))
-                if row == 1 and self.board[row+2][col] == "--": # 2 square move
-                    moves.append(Move((row, col), (row+2, col), self.board))
-            if col - 1 >= 0: # captures to the left
-                if self.board[row+1][col-1][0] == 'w': # enemy piece to capture
-                    moves.append(Move((row, col), (row+1, col-1), self.board))
-                elif (row+1, col-1) == self.enPassantPossible:
-                    moves.append(Move((row, col), (row+1, col-1), self.board, isEnpassantPossible = True))
-            if col + 1 <= 7: # captures to the right
-                if self.board[row+1][col+1][0] == 'w': # enemy piece to capture
-                    moves.append(Move((row, col), (row+1, col+1), self.board))
-                elif (row+1, col+1) == self.enPassantPossible:
-                    moves.append(Move((row, col), (row+1, col+1), self.board, isEnpassantPossible = True))
-        
+    def getPawnMoves(self, row, col, moves, allowed = ALL_SQUARES):
+        sq = row * 8 + col
+        if self.whiteToMove: # white pawns move up the board
+            color, enemyColor, step, startRow = 'w', 'b', -1, 6
+        else: # black pawns move down the board
+            color, enemyColor, step, startRow = 'b', 'w', 1, 1
+        oneStepSq = sq + 8 * step
+        if not (self.occupied >> oneStepSq) & 1: # 1 square move
+            if (allowed >> oneStepSq) & 1:
+                moves.append(Move((row, col), (row + step, col), self.board))
+            twoStepSq = oneStepSq + 8 * step
+            if row == startRow and not (self.occupied >> twoStepSq) & 1 and (allowed >> twoStepSq) & 1: # 2 square move
+                moves.append(Move((row, col), (row + 2 * step, col), self.board))
+        attacks = PAWN_ATTACKS[color][sq]
+        self.addMovesToTargets(row, col, attacks & self.colorBitboards[enemyColor] & allowed, moves) # captures
+        if self.enPassantPossible: # checked on its own, the captured pawn is not on the landing square
+            epRow, epCol = self.enPassantPossible
+            if (attacks >> (epRow * 8 + epCol)) & 1 and self.isEnPassantSafe(sq, epRow * 8 + epCol):
+                moves.append(Move((row, col), (epRow, epCol), self.board, isEnpassantPossible = True))
+
     '''
     Get all the rook moves for the rook located at row, col and add these moves to the list. 
     '''
-    def getRookMoves(self, row, col, moves):
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1)) # up, left, down, right
-        enemyColor = "b" if self.whiteToMove else "w"
-        for dir in directions:
-            for i in range(1, 8):
-                endRow = row + dir[0] * i
-                endCol = col + dir[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--": # empty space valid
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor: # enemy piece valid
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                        break
-                    else: # friendly piece invalid
-                        break
-                else: # off board
-                    break
+    def getRookMoves(self, row, col, moves, allowed = ALL_SQUARES):
+        allyColor = "w" if self.whiteToMove else "b"
+        targets = rookAttacks(row * 8 + col, self.occupied) & ~self.colorBitboards[allyColor] & allowed
+        self.addMovesToTargets(row, col, targets, moves)
 
     ''' 
     Get all the knight moves for the knight located at row, col and add these moves to the list.
     '''
-    def getKnightMoves(self, row, col, moves):
-        knightMoves = ((-2, -1), (-1, -2), (1, -2), (2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1))
+    def getKnightMoves(self, row, col, moves, allowed = ALL_SQUARES):
         allyColor = "w" if self.whiteToMove else "b" # friendly piece
-        for m in knightMoves:
-            endRow = row + m[0]
-            endCol = col + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor: # not a friendly piece (empty or enemy piece)
-                    moves.append(Move((row, col), (endRow, endCol), self.board))
+        targets = KNIGHT_ATTACKS[row * 8 + col] & ~self.colorBitboards[allyColor] & allowed # empty or enemy squares
+        self.addMovesToTargets(row, col, targets, moves)
                     
     ''' 
     Get all the bishop moves for the bishop located at row, col and add these moves to the list.
     '''
-    def getBishopMoves(self, row, col, moves):
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1)) # 4 diagonals
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8): # bishop can move max 7 squares
-                endRow = row + d[0] * i
-                endCol = col + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--": # empty space valid
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor: # enemy piece valid
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                        break
-                    else: # friendly piece invalid
-                        break
-                else: # off board
-                    break
+    def getBishopMoves(self, row, col, moves, allowed = ALL_SQUARES):
+        allyColor = "w" if self.whiteToMove else "b"
+        targets = bishopAttacks(row * 8 + col, self.occupied) & ~self.colorBitboards[allyColor] & allowed
+        self.addMovesToTargets(row, col, targets, moves)
 
     ''' 
     Get all the queen moves for the queen located at row, col and add these moves to the list.
     '''
-    def getQueenMoves(self, row, col, moves):
-        self.getRookMoves(row, col, moves)
-        self.getBishopMoves(row, col, moves)
+    def getQueenMoves(self, row, col, moves, allowed = ALL_SQUARES):
+        self.getRookMoves(row, col, moves, allowed)
+        self.getBishopMoves(row, col, moves, allowed)
 
     ''' 
     Get all the king moves for the king located at row, col and add these moves to the list.
     '''
-    def getKingMoves(self, row, col, moves):
-        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+    def getKingMoves(self, row, col, moves, allowed = ALL_SQUARES):
         allyColor = "w" if self.whiteToMove else "b" # friendly piece
-        for i in range(8):
-            endRow = row + kingMoves[i][0]
-            endCol = col + kingMoves[i][1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor: # not a friendly piece (empty or enemy piece)
-                    moves.append(Move((row, col), (endRow, endCol), self.board))
+        targets = KING_ATTACKS[row * 8 + col] & ~self.colorBitboards[allyColor] & allowed # empty or enemy squares
+        self.addMovesToTargets(row, col, targets, moves)
 
     '''
     Generate all valid castle moves for the king at (row, col) and add them to the list of moves.
@@ -402,8 +1092,13 @@ class CastleRights():
 
 '''
 This class is responsible for storing information about a move.
+Lots of these are created during a search, so the attributes live in __slots__ (no per-move __dict__),
+and everything that can be derived from the squares and pieces (promotion flag, moveID, notation) is
+computed only when asked for.
 '''
 class Move():
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "isEnpassantMove", "isCastleMove")
+
     # maps keys to values
     # key : value
     ranksToRows = {"1":7, "2":6, "3":5, "4":4, "5":3, "6":2, "7":1, "8":0} 
@@ -423,10 +1118,7 @@ class Move():
         self.endCol = endSq[1]
         self.pieceMoved = board[self.startRow][self.startCol]
         self.pieceCaptured = board[self.endRow][self.endCol]
-        
-        # pawn promotion
-        self.isPawnPromotion = (self.pieceMoved == 'wP' and self.endRow == 0) or (self.pieceMoved == 'bP' and self.endRow == 7)
-        
+
         # en passant
         self.isEnpassantMove = isEnpassantPossible
         if self.isEnpassantMove:
@@ -434,9 +1126,20 @@ class Move():
 
         # castle move
         self.isCastleMove = isCastleMove
-        
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
-        #print(self.moveID)
+
+    '''
+    Pawn promotion: a pawn reaching the last rank.
+    '''
+    @property
+    def isPawnPromotion(self):
+        return (self.pieceMoved == 'wP' and self.endRow == 0) or (self.pieceMoved == 'bP' and self.endRow == 7)
+
+    '''
+    Number identifying the move by its start and end squares, e.g. 6444 for (6, 4) -> (4, 4).
+    '''
+    @property
+    def moveID(self):
+        return self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
 
     '''
     Overriding the equals method.
@@ -447,12 +1150,25 @@ class Move():
             return self.moveID == other.moveID
         return False
 
+    '''
+    Moves are hashed by moveID, consistent with __eq__, so they can be used in sets and as dictionary keys.
+    '''
+    def __hash__(self):
+        return self.moveID
+
     '''
     Shortened chess notation for the move.
     '''
     def getChessNotation(self):
         # Make this like real chess notation later
         return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+
+    '''
+    The move in UCI long algebraic notation, e.g. e2e4, e7e8q (promotions are always to a queen).
+    '''
+    def getUCINotation(self):
+        return self.getChessNotation() + ('q' if self.isPawnPromotion else '')
+
     '''
     Get the rank and file of the square.
     0 0 -> a8
@@ -15,6 +15,16 @@ DIMENSION = 8  # dimensions of a chess board are 8x8
 SQ_SIZE = BOARD_HIGHT // DIMENSION
 MAX_FPS = 30  # for animations later on
 IMAGES = {}
+SURFACES = {}  # drawings that never change, made once by prepareSurfaces
+FONTS = {}
+# screen regions, each one is only redrawn (and sent to the display) when something in it changed
+EVAL_PANEL_RECT = p.Rect(0, 0, SIDE_PANEL_WIDTH, BOARD_HIGHT)
+BOARD_RECT = p.Rect(BOARD_ORIGIN_X, 0, BOARD_WITH, BOARD_HIGHT)
+MOVE_LOG_RECT = p.Rect(BOARD_ORIGIN_X + BOARD_WITH, 0, MOVE_LOG_PANEL_WIDTH, BOARD_HIGHT)
+EVAL_BAR_WIDTH = 20
+EVAL_BAR_MARGIN_Y = 12
+MOVE_LOG_PADDING = 5
+MOVES_PER_LINE = 3  # full moves (white and black) on every line of the move log
 
 '''
 Initialize a global dictionary of images. This will be called exactly once in the main.
@@ -25,6 +35,46 @@ def loadImages():
         IMAGES[piece] = p.transform.scale(p.image.load("imagini/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
     # Note: Can access an image by saying 'IMAGES['wP']'
 
+'''
+Render once what every frame used to redraw from scratch: the empty board, the evaluation bar gradient,
+the square highlights and the fonts. Needs the display to be set up.
+'''
+def prepareSurfaces():
+    global colors
+    colors = [p.Color("white"), p.Color("gray")]
+    board = p.Surface((BOARD_WITH, BOARD_HIGHT)).convert()
+    board.fill(p.Color("white"))
+    for row in range(DIMENSION):
+        for col in range(DIMENSION):
+            board.fill(colors[(row + col) % 2], p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    SURFACES['board'] = board
+
+    # evaluation bar gradient: top = green (white advantage), bottom = red (black advantage)
+    green = (70, 200, 120)
+    red = (220, 80, 80)
+    barHeight = BOARD_HIGHT - 2 * EVAL_BAR_MARGIN_Y
+    bar_surf = p.Surface((EVAL_BAR_WIDTH, barHeight)).convert()
+    for y in range(barHeight):
+        t = y / max(1, barHeight - 1)  # 0..1 from top to bottom
+        r = int(green[0] * (1 - t) + red[0] * t)
+        g = int(green[1] * (1 - t) + red[1] * t)
+        b = int(green[2] * (1 - t) + red[2] * t)
+        bar_surf.fill((r, g, b), rect=p.Rect(0, y, EVAL_BAR_WIDTH, 1))
+    # add subtle center neutral overlay to mimic engine bar center contrast
+    center_line_y = barHeight // 2
+    p.draw.line(bar_surf, (50, 50, 50), (0, center_line_y), (EVAL_BAR_WIDTH - 1, center_line_y), 1)
+    SURFACES['evalBar'] = bar_surf
+
+    for name, color in (('selected', 'blue'), ('target', 'yellow')):
+        s = p.Surface((SQ_SIZE, SQ_SIZE))
+        s.set_alpha(100)  # transparency value -> 0 transparent; 255 opaque
+        s.fill(p.Color(color))
+        SURFACES[name] = s
+
+    FONTS['moveLog'] = p.font.SysFont("Arial", 13, False, False)
+    FONTS['eval'] = p.font.SysFont("Arial", 12, True, False)
+    FONTS['endGame'] = p.font.SysFont("Helvetica", 32, True, False)
+
 '''
 This is the main driver for our code. This will handle user input and updating the graphics.
 '''
@@ -39,13 +89,22 @@ def main():
     moveMade = False  # flag variable for when a move is made
     animate = False  # flag variable for when we should animate a move
     loadImages()  # only do this once, before the while loop
+    prepareSurfaces()
     running = True
     sqSelected = ()  # no square is selected, keep track of the last click of the user (tuple: (row,col))
     playerClicks = []  # keep track of player clicks (two tuples: [(6,4), (4,4)])
     gameOver = False
     playerOne = True  # if a human is playing white, then this will be True. If an AI is playing, then False
     playerTwo = False  # same as above but for black
-    moveLogFont = p.font.SysFont("Arial", 13, False, False)
+    aiSearch = None  # the AI's search running in the background, if it is thinking
+    searchStats = None  # statistics of the AI's last search
+    showStats = False  # toggled with 's', shows searchStats under the move log
+    dirtyRects = [screen.get_rect()]  # regions to redraw this frame, nothing is drawn while this stays empty
+    moveLogView = MoveLogView(FONTS['moveLog'])
+    analysis = ChessAI.AnalysisService()  # evaluation bar, deepened in the background
+    ponder = None  # while the human thinks, the AI searching the reply it expects (ChessAI.PonderSearch)
+    ponderOn = True  # toggled with 'p'
+    shownEvalVersion = -1
 
     # while game is running
     while running:
@@ -53,10 +112,19 @@ def main():
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+            elif e.type == p.VIDEOEXPOSE:  # the window was covered or restored, its contents may be gone
+                dirtyRects.append(screen.get_rect())
+
+            # mouse wheel over the move log scrolls it (buttons 4 and 5 are the wheel)
+            elif e.type == p.MOUSEBUTTONDOWN and e.button in (4, 5):
+                if MOVE_LOG_RECT.collidepoint(e.pos):
+                    moveLogView.scroll(-1 if e.button == 4 else 1)
+                    dirtyRects.append(MOVE_LOG_RECT)
 
             # mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
                 if not gameOver and humanTurn:
+                    dirtyRects.append(BOARD_RECT)  # the selection changes
                     location = p.mouse.get_pos()  # (x,y) location of mouse
                     board_x = location[0] - BOARD_ORIGIN_X
                     # ignore clicks outside board area
@@ -88,12 +156,26 @@ def main():
             # key handler
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z:  # undo when 'z' is pressed
+                    if aiSearch is not None:  # the position the AI is thinking about is gone
+                        aiSearch.cancel()
+                        aiSearch = None
+                    if ponder is not None:
+                        ponder.cancel()
+                        ponder = None
                     gs.undoMove()
                     moveMade = True
                     animate = False
                     gameOver = False
 
                 if e.key == p.K_r:  # reset the game when 'r' is pressed
+                    if aiSearch is not None:
+                        aiSearch.cancel()
+                        aiSearch = None
+                    if ponder is not None:
+                        ponder.cancel()
+                        ponder = None
+                    searchStats = None
+                    dirtyRects.append(screen.get_rect())
                     gs = ChessEngine.GameState()
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
@@ -102,12 +184,41 @@ def main():
                     animate = False
                     gameOver = False
 
-        # AI move finder
+                if e.key == p.K_s:  # show or hide the search statistics when 's' is pressed
+                    showStats = not showStats
+                    dirtyRects.append(MOVE_LOG_RECT)
+
+                if e.key == p.K_p:  # switch pondering (the AI thinking on the human's time) on or off when 'p' is pressed
+                    ponderOn = not ponderOn
+                    if ponder is not None:
+                        ponder.cancel()
+                        ponder = None
+
+        # an undo or a reset may have given the move to the other side
+        humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+
+        # AI move finder: the search runs on a worker thread, check once per frame whether it has finished
         if not gameOver and not humanTurn:
-            AIMove = ChessAI.findBestMove(gs, validMoves)
-            gs.makeMove(AIMove)
-            moveMade = True
-            animate = True
+            if aiSearch is None:
+                # the AI's own search feeds the evaluation bar, a second search of the same position would only slow it down
+                analysis.analyse(gs, deepen = False)
+                if ponder is not None and gs.moveLog and ponder.isHit(gs.moveLog[-1]):
+                    aiSearch = ponder  # the human played the expected move: keep the search, it is already under way
+                else:
+                    if ponder is not None:
+                        ponder.cancel()
+                    aiSearch = ChessAI.BackgroundSearch(gs, onIteration = analysis.recorder(gs))
+                ponder = None
+            elif aiSearch.isDone():
+                AIMove = aiSearch.getBestMove()
+                searchStats = aiSearch.getStats()
+                aiSearch = None
+                for move in validMoves:  # play our own copy of the move, the search found it on a snapshot
+                    if move == AIMove:
+                        gs.makeMove(move)
+                        moveMade = True
+                        animate = True
+                        break
 
         if moveMade:
             if animate:
@@ -115,15 +226,29 @@ def main():
             validMoves = gs.getValidMoves()
             moveMade = False
             animate = False
+            dirtyRects.append(screen.get_rect())
+            humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)  # the side to move changed
 
-        drawGameState(screen, gs, validMoves, sqSelected, moveLogFont)
-
-        if gs.checkMate:
+        if gs.checkMate or gs.staleMate:
             gameOver = True
-            drawEndGameText(screen, 'Stalemate' if gs.staleMate else 'Black wins by checkmate' if gs.whiteToMove else 'White wins by checkmate')
+
+        # on the human's turn against the AI, ponder on the reply the AI expects
+        if ponderOn and humanTurn and not gameOver and not (playerOne and playerTwo) and ponder is None:
+            ponder = ChessAI.PonderSearch(gs, ChessAI.guessReply(gs, validMoves, searchStats), analysis = analysis)
+        if gameOver or humanTurn:
+            # while pondering, the ponder search's iterations deepen the evaluation of this position too
+            analysis.analyse(gs, deepen = ponder is None)
+        if analysis.version != shownEvalVersion:
+            shownEvalVersion = analysis.version
+            dirtyRects.append(EVAL_PANEL_RECT)
+
+        # an idle board draws nothing and sends nothing to the display
+        if dirtyRects:
+            drawGameState(screen, gs, validMoves, sqSelected, dirtyRects, moveLogView, analysis, searchStats if showStats else False)
+            p.display.update(dirtyRects)
+            dirtyRects = []
 
         clock.tick(MAX_FPS)
-        p.display.flip()
 
 '''
 Highlight square selected and moves for piece selected.
@@ -134,101 +259,135 @@ def highlightSquares(screen, gs, validMoves, sqSelected):
         if gs.board[row][col][0] == ('w' if gs.whiteToMove else 'b'):  # sqSelected is a piece that can be moved
 
             # highlight selected square
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100)  # transparency value -> 0 transparent; 255 opaque
-            s.fill(p.Color('blue'))
-            screen.blit(s, (BOARD_ORIGIN_X + col*SQ_SIZE, row*SQ_SIZE))
+            screen.blit(SURFACES['selected'], (BOARD_ORIGIN_X + col*SQ_SIZE, row*SQ_SIZE))
 
             # highlight moves from that square
-            s.fill(p.Color('yellow'))
             for move in validMoves:
                 if move.startRow == row and move.startCol == col:
-                    screen.blit(s, (BOARD_ORIGIN_X + move.endCol*SQ_SIZE, move.endRow*SQ_SIZE))
+                    screen.blit(SURFACES['target'], (BOARD_ORIGIN_X + move.endCol*SQ_SIZE, move.endRow*SQ_SIZE))
 
 '''
-Responsible for all the graphics within a current game state.
+Responsible for all the graphics within a current game state, but only for the regions in dirtyRects.
+searchStats is False when the statistics panel is hidden.
 '''
-def drawGameState(screen, gs, getValidMoves, sqSelected, moveLogFont):
-    drawBoard(screen)  # draw squares on the board
-    highlightSquares(screen, gs, getValidMoves, sqSelected)  # highlight square selected and moves
-    drawPieces(screen, gs.board)  # draw pieces on top of those squares
-    drawMoveLog(screen, gs, moveLogFont)
+def drawGameState(screen, gs, getValidMoves, sqSelected, dirtyRects, moveLogView, analysis, searchStats = False):
+    if BOARD_RECT.collidelist(dirtyRects) != -1:
+        drawBoard(screen)  # draw squares on the board
+        highlightSquares(screen, gs, getValidMoves, sqSelected)  # highlight square selected and moves
+        drawPieces(screen, gs.board)  # draw pieces on top of those squares
+        if gs.checkMate or gs.staleMate:
+            drawEndGameText(screen, 'Stalemate' if gs.staleMate else 'Black wins by checkmate' if gs.whiteToMove else 'White wins by checkmate')
+    if MOVE_LOG_RECT.collidelist(dirtyRects) != -1:
+        logBottom = BOARD_HIGHT
+        if searchStats is not False:
+            logBottom = drawSearchStats(screen, searchStats, FONTS['moveLog'])
+        moveLogView.sync(gs.moveLog)
+        moveLogView.draw(screen, p.Rect(MOVE_LOG_RECT.x, 0, MOVE_LOG_RECT.width, logBottom))
+    if EVAL_PANEL_RECT.collidelist(dirtyRects) != -1:
+        drawEvalPanel(screen, gs, analysis)
 
 '''
-Draws the move log.
+View model of the move log panel. The notation of every move is made once, when the move shows up in the game's
+move log, and every line of text is rendered once and kept until its moves change: a new move only re-renders the
+last line, an undo only the lines from the undone move on. Only the lines that fit in the panel are blitted; it
+follows the newest move until the user scrolls back, and scrolling to the bottom again resumes following.
 '''
-def drawMoveLog(screen, gs, font):
-    # right-side move log
-    moveLogRect = p.Rect(BOARD_ORIGIN_X + BOARD_WITH, 0, MOVE_LOG_PANEL_WIDTH, BOARD_HIGHT)
-    p.draw.rect(screen, p.Color("black"), moveLogRect)
-    moveLog = gs.moveLog
-
-    moveTexts = []
-    for i in range(0, len(moveLog), 2):
-        moveString = str(i//2 + 1) + ". " + str(moveLog[i]) + "   "
-        if i + 1 < len(moveLog):  # make sure black made a move
-            moveString += str(moveLog[i + 1])
-        moveTexts.append(moveString)
-    padding = 5
-
-    movePerRow = 3
-    for i in range(len(moveTexts)//movePerRow + 1):
+class MoveLogView():
+    def __init__(self, font):
+        self.font = font
+        self.moves = []  # the Move objects already taken in, to spot undos and a new game
+        self.notations = []  # one string per move
+        self.lineSurfaces = []  # one rendered line per MOVES_PER_LINE full moves, None when it must be rendered again
+        self.firstLine = 0  # first visible line
+        self.visibleLines = 1  # how many lines fit, known after the first draw
+        self.followLatest = True
+
+    '''
+    Catch up with the game's move log: drop the moves that were undone, then add the new ones.
+    '''
+    def sync(self, moveLog):
+        common = min(len(self.moves), len(moveLog))
+        while common > 0 and self.moves[common - 1] is not moveLog[common - 1]:
+            common -= 1
+        if common < len(self.moves):
+            del self.moves[common:]
+            del self.notations[common:]
+            del self.lineSurfaces[-(-common // (2 * MOVES_PER_LINE)):]
+            self.invalidateFrom(common)
+        for move in moveLog[common:]:
+            self.moves.append(move)
+            self.notations.append(str(move))
+            self.invalidateFrom(len(self.moves) - 1)
+
+    '''
+    Mark the line holding the move at this index for rendering (adding the line if it is a new one).
+    '''
+    def invalidateFrom(self, index):
+        line = index // (2 * MOVES_PER_LINE)
+        if line < len(self.lineSurfaces):
+            self.lineSurfaces[line] = None
+        elif index < len(self.moves):
+            self.lineSurfaces.append(None)
+
+    '''
+    Text of one line: "1. e2e4   e7e5   2. ..." for MOVES_PER_LINE full moves.
+    '''
+    def lineText(self, line):
         text = ""
-        for j in range(movePerRow):
-            if i*movePerRow + j < len(moveTexts):
-                text += moveTexts[i*movePerRow + j] + "   "
-        textObject = font.render(text, True, p.Color('Gray'))
-        textLocation = moveLogRect.move(padding, padding + i * textObject.get_height())
-        screen.blit(textObject, textLocation)
-
-    # Evaluation panel on left side
-    leftPanelRect = p.Rect(0, 0, SIDE_PANEL_WIDTH, BOARD_HIGHT)
-    p.draw.rect(screen, p.Color('black'), leftPanelRect)  # panel background
-
-
-    # compute evaluation that takes material into consideration
-    try:
-        # material in pawn units (e.g. +1 means white up one pawn)
-        material = ChessAI.scoreMaterial(gs.board)
-        # full evaluation from scoreBoard (includes material + positional in pawn units)
-        full_score = ChessAI.scoreBoard(gs)
-    except Exception:
-        material = 0
-        full_score = 0
-
-    # positional component (pawn units)
-    positional = full_score - material
-    # material prioritized (centipawns), positional as secondary (scaled)
-    eval_centipawns = material * 100 + positional * 10  # material*100cp + positional*10cp
-
-    # realistic cap: starting material difference is 39 pawn-units -> 39*100 = 3900 centipawns
+        start = line * 2 * MOVES_PER_LINE
+        for i in range(start, min(start + 2 * MOVES_PER_LINE, len(self.notations)), 2):
+            text += str(i//2 + 1) + ". " + self.notations[i] + "   "
+            if i + 1 < len(self.notations):  # make sure black made a move
+                text += self.notations[i + 1]
+            text += "   "
+        return text
+
+    '''
+    Move the view by some lines (negative is back towards the first move).
+    '''
+    def scroll(self, lines):
+        lastFirstLine = max(0, len(self.lineSurfaces) - self.visibleLines)
+        self.firstLine = max(0, min(lastFirstLine, self.firstLine + lines))
+        self.followLatest = self.firstLine >= lastFirstLine
+
+    '''
+    Draw the visible lines into rect, rendering the ones that changed.
+    '''
+    def draw(self, screen, rect):
+        p.draw.rect(screen, p.Color("black"), rect)
+        lineHeight = self.font.get_linesize()
+        self.visibleLines = max(1, (rect.height - 2 * MOVE_LOG_PADDING) // lineHeight)
+        lastFirstLine = max(0, len(self.lineSurfaces) - self.visibleLines)
+        self.firstLine = lastFirstLine if self.followLatest else min(self.firstLine, lastFirstLine)
+        for i in range(self.firstLine, min(len(self.lineSurfaces), self.firstLine + self.visibleLines)):
+            if self.lineSurfaces[i] is None:
+                self.lineSurfaces[i] = self.font.render(self.lineText(i), True, p.Color('Gray'))
+            screen.blit(self.lineSurfaces[i], (rect.x + MOVE_LOG_PADDING, rect.y + MOVE_LOG_PADDING + (i - self.firstLine) * lineHeight))
+
+'''
+Draws the evaluation panel on the left side, with the deepest evaluation the analysis has for the position.
+'''
+def drawEvalPanel(screen, gs, analysis):
+    p.draw.rect(screen, p.Color('black'), EVAL_PANEL_RECT)  # panel background
+
+    # search score from white's point of view, in evaluation points (or a mate score)
+    result = analysis.getEval(gs)
+    depth, score = result if result is not None else (0, ChessAI.scoreBoard(gs))
+    eval_centipawns = score * ChessAI.CENTIPAWNS_PER_POINT
+
+    # realistic cap: starting material difference is 39 pawns -> 39*100 = 3900 centipawns
     MATERIAL_PAWN_CAP = 39
     CAP_CENTIPAWNS = MATERIAL_PAWN_CAP * 100
     normalized = max(-1.0, min(1.0, float(eval_centipawns) / float(CAP_CENTIPAWNS)))  # -1..1
 
     # bar geometry inside left panel
-    bar_width = 20
+    bar_width = EVAL_BAR_WIDTH
     bar_margin_x = (SIDE_PANEL_WIDTH - bar_width) // 2
-    bar_margin_y = 12
-    bar_height = BOARD_HIGHT - 2 * bar_margin_y
-    bar_rect = p.Rect(bar_margin_x, bar_margin_y, bar_width, bar_height)
-
-    # Create gradient surface (top = green (white advantage), bottom = red (black advantage))
-    green = (70, 200, 120)
-    red = (220, 80, 80)
-    bar_surf = p.Surface((bar_width, bar_height))
-    for y in range(bar_height):
-        t = y / max(1, bar_height - 1)  # 0..1 from top to bottom
-        r = int(green[0] * (1 - t) + red[0] * t)
-        g = int(green[1] * (1 - t) + red[1] * t)
-        b = int(green[2] * (1 - t) + red[2] * t)
-        bar_surf.fill((r, g, b), rect=p.Rect(0, y, bar_width, 1))
-    # add subtle center neutral overlay to mimic engine bar center contrast
-    center_line_y = bar_height // 2
-    p.draw.line(bar_surf, (50, 50, 50), (0, center_line_y), (bar_width - 1, center_line_y), 1)
+    bar_height = BOARD_HIGHT - 2 * EVAL_BAR_MARGIN_Y
+    bar_rect = p.Rect(bar_margin_x, EVAL_BAR_MARGIN_Y, bar_width, bar_height)
 
-    # blit the gradient to the left panel
-    screen.blit(bar_surf, (bar_rect.x, bar_rect.y))
+    # blit the pre-rendered gradient to the left panel
+    screen.blit(SURFACES['evalBar'], (bar_rect.x, bar_rect.y))
     # outline
     p.draw.rect(screen, p.Color('black'), bar_rect, 1)
 
@@ -250,14 +409,18 @@ def drawMoveLog(screen, gs, font):
     p.draw.circle(screen, p.Color('black'), (knob_x, knob_y), knob_radius, 1)
 
     # numeric evaluation label (show combined centipawn converted to pawn units for readability)
-    # show "MATE" if very large
-    if abs(eval_centipawns) >= CAP_CENTIPAWNS:
-        eval_label = "MATE"
+    # mate scores as the moves to mate, "MATE" on the final position
+    if abs(score) > ChessAI.MATE_THRESHOLD:
+        mateIn = (ChessAI.CHECKMATE - abs(score) + 1) // 2
+        eval_label = "MATE" if mateIn == 0 else ("+" if score > 0 else "-") + "M" + str(mateIn)
+    elif abs(eval_centipawns) >= CAP_CENTIPAWNS:
+        eval_label = "WIN" if score > 0 else "LOSS"
     else:
         # show in pawn units with two decimals (centipawn -> pawn)
         eval_label = f"{eval_centipawns/100.0:+.2f}"
-    evalFont = p.font.SysFont("Arial", 12, True, False)
-    evalTextObj = evalFont.render(eval_label, True, p.Color('White'))
+    if depth > 0:  # the search depth behind it, it grows while the position stays on the board
+        eval_label += "/" + str(depth)
+    evalTextObj = FONTS['eval'].render(eval_label, True, p.Color('White'))
     text_x = (SIDE_PANEL_WIDTH - evalTextObj.get_width()) // 2
     text_y = bar_rect.bottom + 6
     if text_y + evalTextObj.get_height() > BOARD_HIGHT - 4:
@@ -276,17 +439,43 @@ def drawMoveLog(screen, gs, font):
     if pct_fill > 0:
         p.draw.rect(screen, (200, 200, 200), p.Rect(pct_x, pct_y, pct_fill, pct_h))
 
+'''
+Draws the statistics of the AI's last search at the bottom of the move log panel: the totals and one line per depth.
+Returns the top of the area it used.
+'''
+def drawSearchStats(screen, stats, font):
+    padding = MOVE_LOG_PADDING
+    if stats is None:
+        lines = ["no search yet"]
+    elif not stats.iterations:
+        lines = ["book move"]
+    else:
+        summary = stats.toDict()
+        lines = [f"depth {summary['depth']}  score {summary['score']:+}  {summary['time']:.2f}s",
+                 f"nodes {summary['nodes']} (quiescence {summary['quiescenceNodes']})",
+                 f"{summary['nps']} nodes/s",
+                 f"cutoffs {summary['cutoffs']}, first move {summary['firstMoveCutoffRate']:.0%}",
+                 f"TT hits {summary['ttHits']}/{summary['ttProbes']} ({summary['ttHitRate']:.0%})",
+                 f"null move cutoffs {summary['nullMoveCutoffs']}, reduced {summary['reductions']} ({summary['researches']} again)",
+                 "pv " + " ".join(summary['pv'][:6])]
+        for iteration in summary['iterations']:
+            lines.append(f"  d{iteration['depth']}: {iteration['nodes']} nodes, {iteration['time']:.2f}s, "
+                         f"score {iteration['score']:+}")
+    lineHeight = font.get_linesize()
+    top = BOARD_HIGHT - padding - len(lines) * lineHeight
+    statsRect = p.Rect(BOARD_ORIGIN_X + BOARD_WITH, top - padding, MOVE_LOG_PANEL_WIDTH, BOARD_HIGHT - top + padding)
+    p.draw.rect(screen, p.Color("gray15"), statsRect)
+    for i, line in enumerate(lines):
+        textObject = font.render(line, True, p.Color('White'))
+        screen.blit(textObject, (statsRect.x + padding, top + i * lineHeight))
+    return statsRect.y
+
 '''
 Draw the squares on the board. The top left square is always light.
 '''
 def drawBoard(screen):
-    global colors
-    colors = [p.Color("white"), p.Color("gray")]
-    for row in range(DIMENSION):
-        for coll in range(DIMENSION):
-            color = colors[((row + coll) % 2)]
-            # shift board drawing by BOARD_ORIGIN_X
-            p.draw.rect(screen, color, p.Rect(BOARD_ORIGIN_X + coll * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    # shift board drawing by BOARD_ORIGIN_X
+    screen.blit(SURFACES['board'], BOARD_RECT)
 
 '''
 Draw the pieces on the board using the current GameState.board
@@ -328,7 +517,7 @@ def animateMove(move, screen, board, clock):
 
         # draw moving piece (apply BOARD_ORIGIN_X to interpolated column)
         screen.blit(IMAGES[move.pieceMoved], p.Rect(BOARD_ORIGIN_X + col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        p.display.flip()
+        p.display.update(BOARD_RECT)
         clock.tick(60)
 
 '''
@@ -336,7 +525,7 @@ Draw the end game text.
 '''
 def drawEndGameText(screen, text):
     # use a common font name and center the rendered text surface correctly relative to the board
-    font = p.font.SysFont("Helvetica", 32, True, False)
+    font = FONTS['endGame']
     textObject = font.render(text, True, p.Color('White'))
     # center the text on the board area using the surface width/height
     board_area = p.Rect(BOARD_ORIGIN_X, 0, BOARD_WITH, BOARD_HIGHT)
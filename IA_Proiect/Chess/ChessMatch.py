@@ -0,0 +1,367 @@
+'''
+Self-play match runner: plays games between two ChessAI configurations (search depth, time, nodes, evaluation tables)
+on a process pool, writes them to a PGN file and prints the score, an Elo estimate, an SPRT verdict and the nps.
+Every opening is played twice with the colors swapped, so neither side profits from a lopsided opening.
+Run it from this folder:
+    python ChessMatch.py --engine name=d4,depth=4 --engine name=d3,depth=3 --games 100 --workers 8
+    python ChessMatch.py --engine name=new,eval=tuned.json --engine name=old --tc 10+0.1 --pgn match.pgn
+    python ChessMatch.py --engine name=a,movetime=200 --engine name=b,movetime=200 --openings openings.txt
+Engine options: name, depth, movetime (ms), nodes, hash (MB), eval, a JSON file with "piecesScore" and/or
+"piecePositionScores" (8x8 tables from white's point of view) replacing the ones in ChessAI, and nullmove / lmr
+(1 or 0) to switch null move pruning and late move reductions on or off:
+    python ChessMatch.py --engine name=lmr,movetime=200 --engine name=nolmr,movetime=200,lmr=0 --games 200
+Openings file: one opening per line, either a FEN/EPD or moves in SAN from the start ("1. e4 e5 2. Nf3").
+'''
+
+import argparse
+import datetime
+import json
+import math
+import multiprocessing
+import time
+import ChessEngine, ChessAI, ChessUCI
+
+DEFAULT_OPENINGS = [
+    "1. e4 e5 2. Nf3 Nc6 3. Bb5 a6",
+    "1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5",
+    "1. e4 c5 2. Nf3 d6 3. d4 cxd4 4. Nxd4 Nf6",
+    "1. e4 e6 2. d4 d5 3. Nc3 Nf6",
+    "1. e4 c6 2. d4 d5 3. Nc3 dxe4 4. Nxe4",
+    "1. d4 d5 2. c4 e6 3. Nc3 Nf6",
+    "1. d4 Nf6 2. c4 g6 3. Nc3 Bg7 4. e4 d6",
+    "1. d4 Nf6 2. c4 e6 3. Nc3 Bb4",
+    "1. c4 e5 2. Nc3 Nf6 3. Nf3 Nc6",
+    "1. Nf3 d5 2. g3 Nf6 3. Bg2 c6",
+]
+MAX_PLIES = 400 # games still going after this many half moves are adjudicated as draws
+# the ChessAI globals every player sets to its own for its searches (and puts back afterwards)
+SEARCH_GLOBALS = ("transpositionTable", "historyTable", "piecesScore", "MVV_LVA", "NULL_MOVE_PRUNING", "LATE_MOVE_REDUCTIONS")
+
+'''
+Parse an --engine option like "name=d4,depth=4,eval=tuned.json" into a configuration dictionary.
+'''
+def parseEngine(text):
+    config = {}
+    for option in text.split(","):
+        if "=" not in option:
+            raise ValueError("engine options look like key=value: " + option)
+        key, value = option.split("=", 1)
+        key = key.strip().lower()
+        if key in ("depth", "movetime", "nodes", "hash", "nullmove", "lmr"):
+            value = int(value)
+        elif key not in ("name", "eval"):
+            raise ValueError("unknown engine option: " + key)
+        config[key] = value
+    config.setdefault("name", "engine")
+    return config
+
+'''
+Parse a time control "base+increment" in seconds (e.g. "10+0.1") into (base, increment).
+'''
+def parseTimeControl(text):
+    base, _, increment = text.partition("+")
+    return float(base), float(increment or 0)
+
+'''
+Read an openings file: one FEN/EPD or SAN move sequence per line, blank lines and # comments skipped.
+'''
+def readOpenings(path):
+    with open(path) as openingsFile:
+        return [line.strip() for line in openingsFile if line.strip() and not line.strip().startswith("#")]
+
+'''
+Set up an opening. Returns (GameState, FEN the game starts from or None for the normal start, SAN moves played).
+'''
+def setupOpening(opening):
+    if "/" in opening: # a FEN or EPD line
+        fields = opening.split()
+        countersGiven = len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit()
+        fen = " ".join(fields[:6] if countersGiven else fields[:4])
+        gs = ChessEngine.GameState.fromFEN(fen)
+        return gs, gs.toFEN(), []
+    gs = ChessEngine.GameState()
+    sanMoves = []
+    for token in opening.split():
+        if token.rstrip(".").isdigit() or token.endswith("."): # move numbers
+            continue
+        move = gs.parseSAN(token)
+        if move is None:
+            raise ValueError("illegal move " + token + " in opening: " + opening)
+        sanMoves.append(gs.getSAN(move))
+        gs.makeMove(move)
+    return gs, None, sanMoves
+
+'''
+One side of a game in a worker process. Every player has its own transposition and history tables, evaluation
+(with the move ordering that follows from its piece values) and search switches. They are installed into
+ChessAI/ChessEngine for each of its searches and the previous ones put back after it, so nothing of one player's
+settings is left behind for the other.
+'''
+class EnginePlayer():
+    def __init__(self, config):
+        self.name = config["name"]
+        self.maxDepth = config.get("depth")
+        self.moveTime = config["movetime"] / 1000 if "movetime" in config else None
+        self.nodeLimit = config.get("nodes")
+        self.piecesScore = dict(ChessAI.piecesScore)
+        self.piecePositionScores = dict(ChessAI.piecePositionScores)
+        if "eval" in config:
+            with open(config["eval"]) as evalFile:
+                tables = json.load(evalFile)
+            self.piecesScore.update(tables.get("piecesScore", {}))
+            self.piecePositionScores.update(tables.get("piecePositionScores", {}))
+        self.searchGlobals = {
+            "transpositionTable": ChessAI.TranspositionTable(config.get("hash", ChessAI.HASH_SIZE_MB)),
+            "historyTable": ChessAI.HistoryTable(),
+            "piecesScore": self.piecesScore,
+            "MVV_LVA": ChessAI.buildMVVLVA(self.piecesScore),
+            "NULL_MOVE_PRUNING": bool(config.get("nullmove", ChessAI.NULL_MOVE_PRUNING)),
+            "LATE_MOVE_REDUCTIONS": bool(config.get("lmr", ChessAI.LATE_MOVE_REDUCTIONS)),
+        }
+        self.nodes = 0
+        self.searchTime = 0.0
+
+    '''
+    Search the position and return the move, with timeLimit (seconds) coming from the clock if the game has one.
+    '''
+    def chooseMove(self, gs, timeLimit = None):
+        savedGlobals = {name: getattr(ChessAI, name) for name in SEARCH_GLOBALS}
+        savedTables = (dict(ChessEngine.PIECE_VALUES), dict(ChessEngine.PIECE_SQUARE_VALUES))
+        ChessEngine.setEvaluationTables(self.piecesScore, self.piecePositionScores)
+        gs.refreshScores()
+        for name, value in self.searchGlobals.items():
+            setattr(ChessAI, name, value)
+        if timeLimit is None:
+            timeLimit = self.moveTime
+        maxDepth = self.maxDepth
+        if maxDepth is None and timeLimit is None and self.nodeLimit is None:
+            maxDepth = ChessAI.DEPTH
+        search = ChessAI.SearchContext(maxDepth, timeLimit, self.nodeLimit)
+        try:
+            ChessAI.iterativeDeepening(gs, gs.getValidMoves(), search)
+        finally:
+            for name, value in savedGlobals.items():
+                setattr(ChessAI, name, value)
+            ChessEngine.PIECE_VALUES.update(savedTables[0])
+            ChessEngine.PIECE_SQUARE_VALUES.update(savedTables[1])
+            gs.refreshScores()
+        self.nodes += search.nodes
+        self.searchTime += search.elapsed()
+        return search.bestMove
+
+'''
+Rules that end a game before the AI is asked to move: mate, stalemate, fifty moves, threefold repetition,
+insufficient material and the ply limit. Returns (result, termination) or None if the game goes on.
+'''
+def adjudicate(gs, validMoves, plies):
+    if len(validMoves) == 0:
+        if gs.checkMate:
+            return ("0-1" if gs.whiteToMove else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if gs.halfmoveClock >= 100:
+        return "1/2-1/2", "fifty move rule"
+    if gs.zobristKeyLog.count(gs.zobristKey) >= 3:
+        return "1/2-1/2", "threefold repetition"
+    pieces = gs.bitboards
+    if not (pieces['wP'] | pieces['bP'] | pieces['wR'] | pieces['bR'] | pieces['wQ'] | pieces['bQ']):
+        minors = pieces['wN'] | pieces['bN'] | pieces['wB'] | pieces['bB']
+        if not minors & (minors - 1): # at most one knight or bishop left
+            return "1/2-1/2", "insufficient material"
+    if plies >= MAX_PLIES:
+        return "1/2-1/2", "adjudication"
+    return None
+
+'''
+Worker task: play one game and return everything needed for the PGN and the statistics.
+'''
+def playGame(task):
+    gameNumber, opening, whiteConfig, blackConfig, timeControl = task
+    gs, startFEN, sanMoves = setupOpening(opening)
+    players = {'w': EnginePlayer(whiteConfig), 'b': EnginePlayer(blackConfig)}
+    clocks = {'w': timeControl[0], 'b': timeControl[0]} if timeControl else None
+    plies = 0
+    while True:
+        validMoves = gs.getValidMoves()
+        ending = adjudicate(gs, validMoves, plies)
+        if ending is not None:
+            result, termination = ending
+            break
+        color = 'w' if gs.whiteToMove else 'b'
+        timeLimit = None
+        if clocks:
+            timeLimit = ChessUCI.timeForMove({"wtime": clocks['w'] * 1000, "btime": clocks['b'] * 1000,
+                                              "winc": timeControl[1] * 1000, "binc": timeControl[1] * 1000},
+                                             gs.whiteToMove)
+        start = time.perf_counter()
+        move = players[color].chooseMove(gs, timeLimit)
+        if clocks:
+            clocks[color] -= time.perf_counter() - start
+            if clocks[color] < 0:
+                result, termination = ("0-1" if color == 'w' else "1-0"), "time forfeit"
+                break
+            clocks[color] += timeControl[1]
+        sanMoves.append(gs.getSAN(move))
+        gs.makeMove(move)
+        plies += 1
+    return {"round": gameNumber, "white": players['w'].name, "black": players['b'].name, "result": result,
+            "termination": termination, "fen": startFEN, "moves": sanMoves,
+            "nodes": {color: players[color].nodes for color in "wb"},
+            "time": {color: players[color].searchTime for color in "wb"}}
+
+'''
+PGN text of a finished game.
+'''
+def formatPGN(game, timeControl):
+    tags = [("Event", "ChessAI self-play match"), ("Site", "local"),
+            ("Date", datetime.date.today().strftime("%Y.%m.%d")), ("Round", str(game["round"])),
+            ("White", game["white"]), ("Black", game["black"]), ("Result", game["result"])]
+    if game["fen"]:
+        tags += [("SetUp", "1"), ("FEN", game["fen"])]
+    if timeControl:
+        tags.append(("TimeControl", f"{timeControl[0]:g}+{timeControl[1]:g}"))
+    tags += [("PlyCount", str(len(game["moves"]))), ("Termination", game["termination"])]
+    lines = [f'[{name} "{value}"]' for name, value in tags]
+
+    # number the moves from the starting position
+    whiteToMove, moveNumber = True, 1
+    if game["fen"]:
+        fields = game["fen"].split()
+        whiteToMove, moveNumber = fields[1] == 'w', int(fields[5])
+    tokens = []
+    for i, san in enumerate(game["moves"]):
+        if whiteToMove:
+            tokens.append(f"{moveNumber}.")
+        elif i == 0:
+            tokens.append(f"{moveNumber}...")
+        tokens.append(san)
+        if not whiteToMove:
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    tokens.append(game["result"])
+    movetext = []
+    line = ""
+    for token in tokens: # PGN lines stay under 80 characters
+        if line and len(line) + 1 + len(token) > 79:
+            movetext.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    movetext.append(line)
+    return "\n".join(lines) + "\n\n" + "\n".join(movetext) + "\n\n"
+
+'''
+Elo difference and its 95% error margin from wins, draws and losses (None when it can't be computed yet).
+'''
+def eloEstimate(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return None
+    score = (wins + draws / 2) / games
+    if score <= 0 or score >= 1:
+        return None
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    elo = lambda s: -400 * math.log10(1 / s - 1)
+    margin = 1.96 * math.sqrt(variance / games)
+    lowScore, highScore = max(score - margin, 1e-6), min(score + margin, 1 - 1e-6)
+    return elo(score), (elo(highScore) - elo(lowScore)) / 2
+
+'''
+Sequential probability ratio test of H0: Elo = elo0 against H1: Elo = elo1 (normal approximation of the game scores).
+Returns (log-likelihood ratio, lower bound, upper bound, verdict).
+'''
+def sprt(wins, draws, losses, elo0 = 0, elo1 = 5, alpha = 0.05, beta = 0.05):
+    lower, upper = math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+    games = wins + draws + losses
+    if games == 0 or wins + losses == 0:
+        return 0.0, lower, upper, "continue"
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.0, lower, upper, "continue"
+    expected = lambda elo: 1 / (1 + 10 ** (-elo / 400))
+    score0, score1 = expected(elo0), expected(elo1)
+    llr = games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+    verdict = "H1 accepted" if llr >= upper else "H0 accepted" if llr <= lower else "continue"
+    return llr, lower, upper, verdict
+
+'''
+Play the match and write the PGN. Returns (wins, draws, losses) from the first engine's point of view.
+'''
+def runMatch(engineA, engineB, games = 2, workers = 1, openings = DEFAULT_OPENINGS, timeControl = None,
+             pgnPath = "match.pgn", elo0 = 0, elo1 = 5):
+    tasks = []
+    for gameNumber in range(1, games + 1):
+        opening = openings[((gameNumber - 1) // 2) % len(openings)] # every opening twice, colors swapped
+        white, black = (engineA, engineB) if gameNumber % 2 == 1 else (engineB, engineA)
+        tasks.append((gameNumber, opening, white, black, timeControl))
+    wins = draws = losses = 0
+    nodes = {engineA["name"]: 0, engineB["name"]: 0}
+    searchTime = {engineA["name"]: 0.0, engineB["name"]: 0.0}
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        results = pool.imap_unordered(playGame, tasks) if pool else map(playGame, tasks)
+        with open(pgnPath, "w") as pgnFile:
+            for game in results:
+                pgnFile.write(formatPGN(game, timeControl))
+                pgnFile.flush()
+                for color, name in (('w', game["white"]), ('b', game["black"])):
+                    nodes[name] += game["nodes"][color]
+                    searchTime[name] += game["time"][color]
+                firstIsWhite = game["white"] == engineA["name"]
+                if game["result"] == "1/2-1/2":
+                    draws += 1
+                elif (game["result"] == "1-0") == firstIsWhite:
+                    wins += 1
+                else:
+                    losses += 1
+                print(f"game {game['round']:>4}: {game['white']} - {game['black']} {game['result']:7} "
+                      f"({game['termination']})  {engineA['name']} +{wins} ={draws} -{losses}")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    seconds = time.perf_counter() - start
+
+    played = wins + draws + losses
+    print(f"\n{engineA['name']} vs {engineB['name']}: +{wins} ={draws} -{losses} "
+          f"({100 * (wins + draws / 2) / max(played, 1):.1f}%) in {seconds:.1f}s")
+    estimate = eloEstimate(wins, draws, losses)
+    print(f"Elo: {estimate[0]:+.1f} +/- {estimate[1]:.1f}" if estimate else "Elo: n/a (needs both a win and a loss or draw)")
+    llr, lower, upper, verdict = sprt(wins, draws, losses, elo0, elo1)
+    print(f"SPRT ({elo0}, {elo1}): LLR {llr:.2f} [{lower:.2f}, {upper:.2f}] {verdict}")
+    for name in nodes:
+        print(f"{name}: {nodes[name]} nodes in {searchTime[name]:.1f}s of search, "
+              f"{nodes[name] / max(searchTime[name], 1e-9):.0f} nps")
+    totalTime = sum(searchTime.values())
+    print(f"aggregate: {sum(nodes.values())} nodes, {sum(nodes.values()) / max(totalTime, 1e-9):.0f} nps per process, "
+          f"{sum(nodes.values()) / max(seconds, 1e-9):.0f} nps over the pool")
+    return wins, draws, losses
+
+'''
+Command line entry point.
+'''
+def main():
+    parser = argparse.ArgumentParser(description = "Self-play match between two ChessAI configurations.")
+    parser.add_argument("--engine", action = "append", type = parseEngine, required = True,
+                        help = "engine configuration, give it twice (e.g. name=d4,depth=4)")
+    parser.add_argument("--games", type = int, default = 20, help = "number of games (default 20)")
+    parser.add_argument("--workers", type = int, default = multiprocessing.cpu_count(),
+                        help = "games played at the same time (default: number of CPUs)")
+    parser.add_argument("--tc", help = "time control base+increment in seconds for both engines, e.g. 10+0.1")
+    parser.add_argument("--openings", help = "file with one FEN or SAN move sequence per line")
+    parser.add_argument("--pgn", default = "match.pgn", help = "PGN output file (default match.pgn)")
+    parser.add_argument("--elo0", type = float, default = 0, help = "SPRT null hypothesis Elo (default 0)")
+    parser.add_argument("--elo1", type = float, default = 5, help = "SPRT alternative hypothesis Elo (default 5)")
+    args = parser.parse_args()
+    if len(args.engine) != 2:
+        parser.error("give exactly two --engine options")
+    engineA, engineB = args.engine
+    if engineA["name"] == engineB["name"]:
+        engineB["name"] += "-2"
+    openings = readOpenings(args.openings) if args.openings else DEFAULT_OPENINGS
+    timeControl = parseTimeControl(args.tc) if args.tc else None
+    runMatch(engineA, engineB, args.games, max(1, args.workers), openings, timeControl, args.pgn, args.elo0, args.elo1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+'''
+Perft (performance test) for the move generator in ChessEngine.
+It counts the leaf nodes of the legal move tree down to a fixed depth and compares them with known counts,
+so any change to getValidMoves/makeMove/undoMove can be checked for correctness and speed.
+The suite first checks that GameState.fromFEN turns away or cleans up positions that can't be played from.
+Run it from this folder:
+    python ChessPerft.py                      -> reference suite up to depth 4
+    python ChessPerft.py --depth 5 --workers 8
+    python ChessPerft.py --fen "<fen>" --depth 3 --divide
+'''
+
+import argparse
+import multiprocessing
+import time
+import ChessEngine
+
+# (name, FEN, node counts for depth 1, 2, 3, ...)
+# The engine always promotes to a queen, so where a pawn can promote within the depth the counts are lower than
+# the published ones (which also count under-promotions). Those counts were checked against the published
+# numbers with under-promotions generated, then recorded here for the queen-only rule.
+REFERENCE_POSITIONS = [
+    ("initial position", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4074224]), # published depth 4: 4085603
+    ("en passant and pins", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("castling and promotion", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 228, 8087, 320802]), # published: 6, 264, 9467, 422333
+    ("promotion with check", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [41, 1373, 54007, 1806790]), # published: 44, 1486, 62379, 2103487
+    ("illegal en passant (rank pin)", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+     [18, 92, 1670, 10138, 185429, 1132035]),
+    ("en passant giving check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     [15, 126, 1928, 13931, 206136, 1438912]),
+    ("illegal en passant (diagonal pin)", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+     [13, 102, 1266, 10276, 135655, 1013750]),
+    ("short castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+     [15, 66, 1198, 6399, 120330, 661072]),
+    ("long castling gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1",
+     [16, 71, 1286, 7418, 141077, 803711]),
+    ("castling rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+     [26, 1141, 27826, 1274206]),
+    ("castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+     [44, 1494, 50509, 1720476]),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+     [5, 75, 694, 9674, 128641, 1783549]),
+    ("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1",
+     [29, 165, 5160, 30674, 963213]),
+    ("promote to give check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+     [6, 28, 248, 1379, 18382, 96431]),
+    ("promotion next to the kings", "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+     [3, 13, 111, 553, 7461, 35337]),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+     [2, 6, 13, 63, 331, 1924]),
+    ("stalemate and checkmate", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+     [7, 19, 129, 498, 4217, 18519, 188160]),
+    ("double check", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1",
+     [37, 183, 6559, 23527]),
+]
+
+# (name, FEN, what fromFEN must make of it: None if it has to raise ValueError, else the FEN the position gives back)
+FEN_CHECKS = [
+    ("en passant square off the board", "4k3/8/8/8/8/8/8/4K3 w - e9 0 1", None),
+    ("en passant square on the wrong rank", "4k3/8/8/8/8/8/8/4K3 w - e3 0 1", None),
+    ("no black king", "8/8/8/8/8/8/8/4K3 w - - 0 1", None),
+    ("two white kings", "4k3/8/8/8/8/8/8/4KK2 w - - 0 1", None),
+    ("bad side to move", "4k3/8/8/8/8/8/8/4K3 x - - 0 1", None),
+    ("pawn on the last rank", "P3k3/8/8/8/8/8/8/4K3 w - - 0 1", None),
+    ("pawn on the first rank", "4k3/8/8/8/8/8/8/p3K3 b - - 0 1", None),
+    ("side not to move in check", "4k3/8/8/8/8/8/4Q3/4K3 w - - 0 1", None),
+    ("castling rights without king or rook", "r3k3/8/8/8/8/8/8/4K2R w KQkq - 0 1",
+     "r3k3/8/8/8/8/8/8/4K2R w Kq - 0 1"),
+    ("en passant square without the pawn", "4k3/8/8/8/8/8/8/4K3 w - d6 0 1", "4k3/8/8/8/8/8/8/4K3 w - - 0 1"),
+    ("en passant square after a double step", "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2",
+     "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2"),
+]
+
+'''
+Count the leaf nodes of the legal move tree depth plies below the current position.
+'''
+def perft(gs, depth):
+    if depth == 0:
+        return 1
+    moves = gs.getValidMoves()
+    if depth == 1: # the leaves don't need to be played, counting them is enough
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+'''
+Worker task: play the root move with the given index and count the nodes below it.
+The GameState arrives pickled, so every task works on its own copy.
+'''
+def perftRootMove(task):
+    gs, moveIndex, depth = task
+    move = gs.getValidMoves()[moveIndex]
+    gs.makeMove(move)
+    return move.getChessNotation(), perft(gs, depth - 1)
+
+'''
+Node count below every root move, as a list of (move notation, nodes).
+With more than one worker the root moves are shared out over a process pool.
+'''
+def divide(gs, depth, workers = 1):
+    tasks = [(gs, i, depth) for i in range(len(gs.getValidMoves()))]
+    if workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            return pool.map(perftRootMove, tasks, chunksize = 1)
+    return [perftRootMove(task) for task in tasks]
+
+'''
+Perft that can spread the root moves over several processes. Returns (nodes, seconds).
+'''
+def timedPerft(gs, depth, workers = 1):
+    start = time.perf_counter()
+    if workers > 1 and depth > 1:
+        nodes = sum(count for _, count in divide(gs, depth, workers))
+    else:
+        nodes = perft(gs, depth)
+    return nodes, time.perf_counter() - start
+
+'''
+Set up every FEN of FEN_CHECKS, print the results and return True if fromFEN did what was expected with all of them.
+'''
+def checkFENs(checks = FEN_CHECKS):
+    allPassed = True
+    for name, fen, expected in checks:
+        try:
+            result = ChessEngine.GameState.fromFEN(fen).toFEN()
+        except ValueError:
+            result = None
+        passed = result == expected
+        allPassed = allPassed and passed
+        print(f"{'ok  ' if passed else 'FAIL'} {name:40} {result or 'rejected'}")
+    return allPassed
+
+'''
+Run the FEN checks and every reference position up to maxDepth, print the results and return True if all passed.
+'''
+def runSuite(maxDepth = 4, workers = 1, positions = REFERENCE_POSITIONS):
+    allPassed = checkFENs()
+    totalNodes = 0
+    totalTime = 0.0
+    for name, fen, counts in positions:
+        for depth in range(1, min(maxDepth, len(counts)) + 1):
+            nodes, seconds = timedPerft(ChessEngine.GameState.fromFEN(fen), depth, workers)
+            passed = nodes == counts[depth - 1]
+            allPassed = allPassed and passed
+            totalNodes += nodes
+            totalTime += seconds
+            print(f"{'ok  ' if passed else 'FAIL'} {name:34} depth {depth}  nodes {nodes:>9} "
+                  f"(expected {counts[depth - 1]:>9})  {seconds:7.2f}s  {nodes / max(seconds, 1e-9):>9.0f} nps")
+    print(f"{'all passed' if allPassed else 'FAILED'}: {totalNodes} nodes in {totalTime:.2f}s, "
+          f"{totalNodes / max(totalTime, 1e-9):.0f} nps")
+    return allPassed
+
+'''
+Command line entry point.
+'''
+def main():
+    parser = argparse.ArgumentParser(description = "Perft / divide for the chess move generator.")
+    parser.add_argument("--depth", type = int, default = 4, help = "maximum depth (default 4)")
+    parser.add_argument("--workers", type = int, default = 1, help = "processes to spread root moves over")
+    parser.add_argument("--fen", help = "run a single position instead of the reference suite")
+    parser.add_argument("--divide", action = "store_true", help = "print the node count under every root move")
+    args = parser.parse_args()
+
+    if args.fen is None:
+        raise SystemExit(0 if runSuite(args.depth, args.workers) else 1)
+
+    gs = ChessEngine.GameState.fromFEN(args.fen)
+    if args.divide:
+        start = time.perf_counter()
+        results = divide(gs, args.depth, args.workers)
+        seconds = time.perf_counter() - start
+        for notation, nodes in results:
+            print(notation + ": " + str(nodes))
+        nodes = sum(count for _, count in results)
+    else:
+        nodes, seconds = timedPerft(gs, args.depth, args.workers)
+    print(f"nodes {nodes}  time {seconds:.2f}s  {nodes / max(seconds, 1e-9):.0f} nps")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+'''
+Search benchmark for ChessAI: searches a set of positions to a fixed depth with one worker and with several,
+and reports the time, nodes per second and the speedup of the parallel search against the single worker.
+Run it from this folder:
+    python ChessSearchBench.py                     -> depth 4, as many workers as there are CPUs
+    python ChessSearchBench.py --depth 5 --workers 8
+    python ChessSearchBench.py --fen "<fen>" --depth 5
+    python ChessSearchBench.py --workers 1 --stats   -> also the full search statistics of every position as JSON
+    python ChessSearchBench.py --workers 1 --no-null-move --no-lmr   -> the same without the selective search
+'''
+
+import argparse
+import multiprocessing
+import time
+import ChessEngine, ChessAI
+
+BENCH_POSITIONS = [
+    ("initial position", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("italian game", "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("queen's gambit declined", "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4"),
+    ("rook endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+    ("middlegame", "2r3k1/pp3ppp/2n1b3/3p4/3P4/2NB1N2/PP3PPP/R5K1 w - - 0 1"),
+]
+
+'''
+Search one position from a clean transposition table. Returns the search context and the seconds it took.
+'''
+def timedSearch(fen, depth, workers):
+    gs = ChessEngine.GameState.fromFEN(fen)
+    ChessAI.transpositionTable.clear()
+    ChessAI.historyTable.clear()
+    search = ChessAI.SearchContext(maxDepth = depth)
+    start = time.perf_counter()
+    if workers > 1:
+        ChessAI.parallelSearch(gs, gs.getValidMoves(), search, workers)
+    else:
+        ChessAI.iterativeDeepening(gs, gs.getValidMoves(), search)
+    return search, time.perf_counter() - start
+
+'''
+Run every position with 1 worker and with the given number of workers, print both and the speedup.
+'''
+def runBench(depth = 4, workers = 2, positions = BENCH_POSITIONS, showStats = False):
+    if workers > 1:
+        ChessAI.getWorkerPool(workers) # start the processes before the clock runs
+    totals = {1: [0, 0.0], workers: [0, 0.0]}
+    for name, fen in positions:
+        for count in sorted(totals):
+            search, seconds = timedSearch(fen, depth, count)
+            totals[count][0] += search.nodes
+            totals[count][1] += seconds
+            summary = search.stats.toDict()
+            print(f"{name:24} workers {count:>2}  move {str(search.bestMove):7} score {search.bestScore:>5}  "
+                  f"nodes {search.nodes:>8}  {seconds:7.2f}s  {search.nodes / max(seconds, 1e-9):>7.0f} nps  "
+                  f"first move cutoffs {summary['firstMoveCutoffRate']:.1%}")
+            if showStats:
+                print(search.stats.toJSON(indent = 2))
+    for count in sorted(totals):
+        nodes, seconds = totals[count]
+        print(f"workers {count:>2}: {nodes} nodes in {seconds:.2f}s, {nodes / max(seconds, 1e-9):.0f} nps")
+    if workers > 1:
+        print(f"speedup with {workers} workers: {totals[1][1] / max(totals[workers][1], 1e-9):.2f}x")
+
+'''
+Command line entry point.
+'''
+def main():
+    parser = argparse.ArgumentParser(description = "Fixed depth search benchmark, single worker against several.")
+    parser.add_argument("--depth", type = int, default = 4, help = "search depth (default 4)")
+    parser.add_argument("--workers", type = int, default = multiprocessing.cpu_count(),
+                        help = "processes for the parallel search (default: number of CPUs)")
+    parser.add_argument("--fen", help = "benchmark a single position instead of the built-in set")
+    parser.add_argument("--stats", action = "store_true", help = "print the search statistics of every search as JSON")
+    parser.add_argument("--no-null-move", action = "store_true", help = "switch off null move pruning")
+    parser.add_argument("--no-lmr", action = "store_true", help = "switch off late move reductions")
+    args = parser.parse_args()
+    ChessAI.NULL_MOVE_PRUNING = not args.no_null_move
+    ChessAI.LATE_MOVE_REDUCTIONS = not args.no_lmr
+    positions = [("position", args.fen)] if args.fen else BENCH_POSITIONS
+    runBench(args.depth, max(1, args.workers), positions, args.stats)
+
+if __name__ == "__main__":
+    main()
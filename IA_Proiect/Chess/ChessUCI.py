@@ -0,0 +1,280 @@
+'''
+UCI (Universal Chess Interface) front-end for the engine, so it can be driven by tournament managers and scripts
+over stdin/stdout without a display. It only uses ChessEngine and ChessAI, pygame is never imported.
+Run it from this folder:
+    python ChessUCI.py
+Supported: uci, isready, ucinewgame, setoption (Hash, Threads, BookFile, Ponder), position startpos|fen ... [moves ...],
+go [depth N] [movetime MS] [wtime MS btime MS winc MS binc MS movestogo N] [nodes N] [infinite] [ponder],
+ponderhit, stop, quit.
+Promotions are always to a queen, like everywhere else in the engine.
+Pondering: "go ponder" searches the position after the expected reply (already in the position command) with no
+limits; on ponderhit the same search goes on, now with the time of the go command counted from the hit.
+A ponder search always runs in this process, the parallel search can't change its limits once started.
+'''
+
+import copy
+import sys
+import threading
+import ChessEngine, ChessAI
+
+ENGINE_NAME = "ProiectInteligentaArtificiala"
+ENGINE_AUTHOR = "HappyPlayer72"
+DEFAULT_MOVES_TO_GO = 30 # moves the remaining clock time is shared over when the GUI doesn't say
+MOVE_OVERHEAD = 0.05 # seconds kept back on every move for the communication with the GUI
+MAX_THREADS = 64
+
+'''
+Find the legal move written in UCI notation (e2e4, e7e8q) in the given position, or None if there is none.
+'''
+def parseMove(gs, text):
+    for move in gs.getValidMoves():
+        if move.getChessNotation() == text[:4]:
+            return move
+    return None
+
+'''
+UCI score: "cp N" from the side to move's point of view, or "mate N" in moves (negative when getting mated).
+The evaluation isn't in pawns, its points are converted with ChessAI.CENTIPAWNS_PER_POINT.
+'''
+def formatScore(score):
+    if score > ChessAI.MATE_THRESHOLD:
+        return "mate " + str((ChessAI.CHECKMATE - score + 1) // 2)
+    if score < -ChessAI.MATE_THRESHOLD:
+        return "mate " + str(-((ChessAI.CHECKMATE + score) // 2))
+    return "cp " + str(score * ChessAI.CENTIPAWNS_PER_POINT)
+
+'''
+Seconds to spend on this move from the go parameters, or None for no time limit.
+A fixed movetime is used as is; with a clock, the remaining time is shared over the moves still to go plus the increment.
+'''
+def timeForMove(params, whiteToMove):
+    if "movetime" in params:
+        return max(0.01, params["movetime"] / 1000 - MOVE_OVERHEAD)
+    remaining = params.get("wtime" if whiteToMove else "btime")
+    if remaining is None:
+        return None
+    increment = params.get("winc" if whiteToMove else "binc", 0)
+    movesToGo = params.get("movestogo", DEFAULT_MOVES_TO_GO)
+    budget = remaining / max(1, movesToGo) + increment * 3 / 4
+    # never plan to use more than a third of what is left on the clock
+    return max(0.01, min(budget, remaining / 3) / 1000 - MOVE_OVERHEAD)
+
+'''
+The engine side of the protocol: keeps the current position and runs at most one search at a time on a thread,
+so the input loop can still answer isready and react to stop while it thinks.
+'''
+class UCIEngine():
+    def __init__(self, output = sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock() # the search thread and the input loop both print
+        self.gs = ChessEngine.GameState()
+        self.workers = 1
+        self.search = None
+        self.searchThread = None
+        self.stopEvent = threading.Event() # set by stop, an infinite search holds its bestmove until then
+        self.ponderLimits = None # (time limit, depth) to apply on ponderhit while a ponder search runs
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    '''
+    Handle one line of input. Returns False when the engine should quit.
+    '''
+    def handleCommand(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send(f"option name Hash type spin default {ChessAI.HASH_SIZE_MB} min 1 max 4096")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name Ponder type check default false")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stopSearch()
+            ChessAI.transpositionTable.clear()
+            ChessAI.historyTable.clear()
+        elif command == "setoption":
+            self.setOption(args)
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(args)
+        elif command == "go":
+            self.stopSearch()
+            self.go(args)
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "quit":
+            self.stopSearch()
+            return False
+        return True
+
+    '''
+    setoption name <name> value <value>, for Hash (MB), Threads and BookFile (a Polyglot book, <empty> for none).
+    Ponder only tells us the GUI may send go ponder, nothing needs to change for it.
+    '''
+    def setOption(self, args):
+        if "name" not in args or "value" not in args:
+            return
+        name = " ".join(args[args.index("name") + 1:args.index("value")]).lower()
+        value = " ".join(args[args.index("value") + 1:])
+        try:
+            if name == "hash":
+                self.stopSearch()
+                ChessAI.setHashSize(max(1, int(value)))
+            elif name == "threads":
+                self.stopSearch()
+                self.workers = max(1, min(MAX_THREADS, int(value)))
+                if self.workers > 1:
+                    # start the processes here and not from the search thread: a process forked while the
+                    # input loop is blocked reading stdin would hang trying to close its copy of stdin
+                    ChessAI.getWorkerPool(self.workers)
+            elif name == "bookfile":
+                self.stopSearch()
+                ChessAI.setOpeningBook(None if value in ("", "<empty>") else value)
+        except (ValueError, OSError):
+            self.send("info string invalid value for " + name + ": " + value)
+
+    '''
+    position startpos [moves ...] or position fen <fen> [moves ...]
+    '''
+    def setPosition(self, args):
+        movesAt = args.index("moves") if "moves" in args else len(args)
+        try:
+            if args and args[0] == "fen":
+                gs = ChessEngine.GameState.fromFEN(" ".join(args[1:movesAt]))
+            else:
+                gs = ChessEngine.GameState()
+        except ValueError as error:
+            self.send("info string " + str(error))
+            return
+        for text in args[movesAt + 1:]:
+            move = parseMove(gs, text)
+            if move is None:
+                self.send("info string illegal move " + text)
+                break
+            gs.makeMove(move)
+        self.gs = gs
+
+    '''
+    Start searching the current position with the limits given by the go command.
+    '''
+    def go(self, args):
+        params = {}
+        infinite = ponder = False
+        i = 0
+        while i < len(args):
+            if args[i] in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes") and i + 1 < len(args):
+                try:
+                    params[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:
+                infinite = infinite or args[i] == "infinite"
+                ponder = ponder or args[i] == "ponder"
+                i += 1
+        timeLimit = None if infinite else timeForMove(params, self.gs.whiteToMove)
+        maxDepth = params.get("depth")
+        self.ponderLimits = None
+        if ponder:
+            # search without limits until ponderhit brings in the real ones, or stop
+            self.ponderLimits = (timeLimit, maxDepth)
+            timeLimit = None
+            maxDepth = ChessAI.MAX_SEARCH_DEPTH
+        if maxDepth is None and timeLimit is None and "nodes" not in params:
+            maxDepth = ChessAI.MAX_SEARCH_DEPTH # go infinite, or go without limits: search until stop
+        self.search = ChessAI.SearchContext(maxDepth, timeLimit, params.get("nodes"))
+        self.stopEvent.clear()
+        # a ponder search holds its bestmove like an infinite one, until ponderhit or stop
+        self.searchThread = threading.Thread(target = self.runSearch, args = (self.search, infinite or ponder, ponder), daemon = True)
+        self.searchThread.start()
+
+    '''
+    The opponent played the move we were pondering on: the running search becomes the normal search of the position,
+    with the limits of the go ponder command from now on, and answers with bestmove as soon as it is done.
+    '''
+    def ponderHit(self):
+        if self.searchThread is None or self.ponderLimits is None:
+            return
+        timeLimit, maxDepth = self.ponderLimits
+        self.ponderLimits = None
+        self.search.setLimits(timeLimit, maxDepth)
+        self.stopEvent.set() # bestmove is no longer held back
+
+    '''
+    Search thread: search a copy of the position and answer with bestmove when done.
+    In infinite mode bestmove may only be sent after stop, even if the search ended by itself (a mate was found).
+    A ponder search holds it the same way, until ponderhit or stop.
+    With several threads stop reaches the worker processes too (parallelSearch watches search.stop()), so
+    go infinite or a deep go depth still answer right away.
+    '''
+    def runSearch(self, search, infinite, ponder = False):
+        gs = copy.deepcopy(self.gs)
+        validMoves = gs.getValidMoves()
+        search.bestMove = None if infinite else ChessAI.probeBook(gs, validMoves)
+        if search.bestMove is not None:
+            self.send("info string book move")
+        elif self.workers > 1 and not ponder:
+            ChessAI.parallelSearch(gs, validMoves, search, self.workers)
+            if search.bestMove is not None:
+                self.sendInfo(search, gs) # the workers report nothing while they run
+        else:
+            search.onIteration = lambda search: self.sendInfo(search, gs)
+            ChessAI.iterativeDeepening(gs, validMoves, search)
+        if infinite:
+            self.stopEvent.wait()
+        if search.bestMove is None:
+            self.send("bestmove 0000") # no legal moves
+            return
+        line = "bestmove " + search.bestMove.getUCINotation()
+        pv = search.stats.iterations[-1]["pv"] if search.stats.iterations else []
+        if len(pv) > 1 and pv[0] == search.bestMove.getUCINotation():
+            line += " ponder " + pv[1] # the reply we expect, for the GUI to let us ponder on
+        self.send(line)
+
+    '''
+    info line for the last completed iteration, gs is the position searched (back at the root).
+    '''
+    def sendInfo(self, search, gs):
+        elapsed = search.elapsed()
+        line = f"info depth {search.completedDepth} score {formatScore(search.bestScore)} nodes {search.nodes} " \
+               f"nps {int(search.nodes / max(elapsed, 1e-6))} time {int(elapsed * 1000)}"
+        pv = ChessAI.getPrincipalVariation(gs, search.completedDepth)
+        if not pv or pv[0] != search.bestMove: # the table entry was overwritten, the best move is still known
+            pv = [search.bestMove]
+        self.send(line + " pv " + " ".join(move.getUCINotation() for move in pv))
+
+    '''
+    Stop the running search, if any, and wait for its bestmove to be sent. This returns within a few milliseconds
+    with one thread or several; the commands that call it (position, go, setoption, quit) rely on that.
+    '''
+    def stopSearch(self):
+        if self.searchThread is not None:
+            self.search.stop()
+            self.stopEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+            self.search = None
+
+'''
+Read commands from stdin until quit or end of input.
+'''
+def main():
+    engine = UCIEngine()
+    for line in sys.stdin:
+        if not engine.handleCommand(line.strip()):
+            break
+    engine.stopSearch()
+
+if __name__ == "__main__":
+    main()